@@ -20,6 +20,14 @@ class Cost:
 class Unit:
     """所有单位的基类 - 森林的根节点"""
     
+    # 每定义一个新的单位子类递增，用于使按类层次缓存的结果失效
+    _subclass_generation: int = 0
+    
+    def __init_subclass__(cls, **kwargs):
+        """记录单位类层次的变化，使按类层次缓存的结果（如 GraphNode.from_class_tree）失效"""
+        super().__init_subclass__(**kwargs)
+        Unit._subclass_generation += 1
+    
     def __init__(self):
         # 核心标识属性
         self.unique_class_name: str = self.__class__.__name__
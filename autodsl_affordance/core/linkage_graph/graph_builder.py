@@ -325,6 +325,7 @@ class ProgramLinkageGraph:
         self.current_phase = None
         self.traversal_complete = False
         self.traversal_history = {}
+        self.traversal_strategy.reset()
         
         # 执行所有阶段
         while not self.traversal_complete:
@@ -27,6 +27,8 @@ class PrefabFunctionManager:
         self.unit_index: Dict[str, List[str]] = defaultdict(list)
         self.execution_type_index: Dict[str, List[str]] = defaultdict(list)
         self.tactic_category_index: Dict[str, List[str]] = defaultdict(list)
+        # 函数库修改计数，每次加载/添加/移除/聚合参数后递增，供调用方判断缓存是否失效
+        self.revision = 0
         # 初始化 Schema 验证器
         schema_path = os.path.join(current_file_dir, '..', 'prefab_functions', 'schema', 'prefab_function.schema.json')
         self.validator = PrefabFunctionSchemaValidator(schema_path)
@@ -103,6 +105,7 @@ class PrefabFunctionManager:
                 self.unit_index.clear()
                 self.execution_type_index.clear()
                 self.tactic_category_index.clear()
+            self.revision += 1
             
             # 加载过滤后的函数并构建索引
             valid_functions = 0
@@ -230,6 +233,7 @@ class PrefabFunctionManager:
         
         # 获取要移除的函数
         func = self.prefab_functions.pop(function_id)
+        self.revision += 1
         
         # 更新所有索引
         # 1. 函数类型索引
@@ -331,6 +335,7 @@ class PrefabFunctionManager:
             logger.warning(f"预制函数 {function_id} 已存在，将覆盖")
         
         self.prefab_functions[function_id] = func
+        self.revision += 1
         
         # 更新索引
         self.function_type_index[func['function_type']].append(function_id)
@@ -552,6 +557,7 @@ class PrefabFunctionManager:
         
         for func_id in self.prefab_functions:
             self.prefab_functions[func_id] = self.aggregate_parameters(self.prefab_functions[func_id])
+        self.revision += 1
         
         logger.info("所有预制函数参数聚合完成")
     
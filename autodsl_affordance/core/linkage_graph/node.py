@@ -1,9 +1,46 @@
-from typing import Dict, List, Any, Optional
+from typing import IO, Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+import collections
+import functools
 import inspect
-from dataclasses import dataclass
+import json
+import operator
+import sys
+from dataclasses import asdict, dataclass, is_dataclass
 from typing import Type
 
-@dataclass
+from autodsl_affordance.core.base_units.unit import Unit
+
+try:
+    import orjson
+except ImportError:
+    # 未安装 orjson 时 to_json 回退到标准库 json
+    orjson = None  # type: ignore[assignment]
+
+# 从单位实例复制到节点的属性名
+_COPY_ATTRS: Tuple[str, ...] = (
+    'llm_interface', 'visual_recognition', 'tactical_context',
+    'strong_against', 'weak_against', 'abilities', 'upgrades', 'tactical_info',
+    'description', 'race', 'unit_type',
+)
+
+# 种族、类型名等字符串在整张图中大量重复，驻留后共享同一对象
+_intern = sys.intern
+
+# getattr 缺省值哨兵
+_SENTINEL: Any = object()
+
+# 签名中"无注解"标记，预先绑定以免在参数循环中重复查找
+_EMPTY = inspect.Parameter.empty
+_EMPTY_RET = inspect.Signature.empty
+
+# 无默认值时必须显式传入的参数类型
+_REQUIRED_KINDS = (
+    inspect.Parameter.POSITIONAL_ONLY,
+    inspect.Parameter.POSITIONAL_OR_KEYWORD,
+    inspect.Parameter.KEYWORD_ONLY,
+)
+
+@dataclass(slots=True)
 class NodeAttribute:
     """节点属性类"""
     name: str
@@ -12,34 +49,63 @@ class NodeAttribute:
     description: str = ""
     is_required: bool = False
 
-@dataclass
+class Param(NamedTuple):
+    """方法参数（名称、类型），序列化时转为 {"name", "type"} 字典"""
+    name: str
+    type: str
+    
+    def get(self, key: str, default: Any = None) -> Any:
+        """按字段名取值，兼容原先以字典访问参数的调用方（如 param.get('type', '')）"""
+        return getattr(self, key, default) if key in self._fields else default
+
+@dataclass(slots=True)
 class NodeMethod:
     """节点方法类"""
     name: str
     return_type: str
-    parameters: List[Dict[str, str]]
+    parameters: List[Param]
     description: str = ""
     is_overridden: bool = False
 
+# to_dict 序列化字段顺序及批量取值器（一次调用取出全部字段）
+_ATTR_FIELDS: Tuple[str, ...] = ('name', 'data_type', 'default_value', 'description', 'is_required')
+_ATTR_GETTER = operator.attrgetter(*_ATTR_FIELDS)
+_METHOD_FIELDS: Tuple[str, ...] = ('name', 'return_type', 'parameters', 'description', 'is_overridden')
+_METHOD_GETTER = operator.attrgetter(*_METHOD_FIELDS)
+
 class GraphNode:
     """程序链接图的节点类"""
     
-    def __init__(self, class_obj=None, **kwargs):
+    # 节点数量较多时省去每个实例的 __dict__；仅在部分路径上设置的属性
+    # （如 strong_against）同样需要声明，未设置时访问仍抛出 AttributeError
+    __slots__ = (
+        'node_id', 'class_name', 'unique_class_name',
+        'inheritance_chain', 'parent_class', 'inheritance_depth',
+        '_attributes', '_raw_instance_dict', '_methods', '_methods_class',
+        'llm_interface', 'visual_recognition', 'tactical_context',
+        'description', 'race', 'unit_type',
+        'strong_against', 'weak_against', 'abilities', 'upgrades', 'tactical_info',
+        'counter_relations', 'prefab_function_candidates', 'build_requirements',
+    )
+    
+    def __init__(self, class_obj: Optional[Type] = None, **kwargs: Any) -> None:
         # 基本标识信息
         self.node_id: str = kwargs.get('node_id', '')
         self.class_name: str = kwargs.get('class_name', '')
         self.unique_class_name: str = kwargs.get('unique_class_name', '')
         
         # 类层次关系
-        self.inheritance_chain: List[str] = kwargs.get('inheritance_chain', [])
+        self.inheritance_chain: Tuple[str, ...] = tuple(kwargs.get('inheritance_chain', ()))
         self.parent_class: Optional[str] = kwargs.get('parent_class', None)
         self.inheritance_depth: int = kwargs.get('inheritance_depth', 0)
         
-        # 属性映射
-        self.attributes: List[NodeAttribute] = kwargs.get('attributes', [])
+        # 属性映射（从类构建时延迟到首次访问 attributes 才生成）
+        self._raw_instance_dict: Optional[Dict[str, Any]] = None
+        self._attributes: Optional[Tuple[NodeAttribute, ...]] = tuple(kwargs.get('attributes', ()))
         
-        # 方法映射
-        self.methods: List[NodeMethod] = kwargs.get('methods', [])
+        # 方法映射（从类构建时延迟到首次访问 methods 才生成）
+        self._methods_class: Optional[Type] = None
+        self._methods: Optional[Tuple[NodeMethod, ...]] = tuple(kwargs.get('methods', ()))
         
         # VLM接口信息
         self.llm_interface: Dict[str, Any] = kwargs.get('llm_interface', {})
@@ -53,8 +119,34 @@ class GraphNode:
         
         # 如果提供了类对象，自动从类对象构建节点
         if class_obj:
-            self._build_from_class(class_obj)
+            self._populate_from_class(class_obj)
             
+    @property
+    def attributes(self) -> Tuple[NodeAttribute, ...]:
+        """节点属性（不可变元组），首次访问时由实例属性快照生成"""
+        if self._attributes is None:
+            self._attributes = _build_attributes(self._raw_instance_dict or {})
+            self._raw_instance_dict = None
+        return self._attributes
+    
+    @attributes.setter
+    def attributes(self, value: Iterable[NodeAttribute]) -> None:
+        self._attributes = tuple(value)
+        self._raw_instance_dict = None
+    
+    @property
+    def methods(self) -> Tuple[NodeMethod, ...]:
+        """节点方法（不可变元组），首次访问时由类的反射结果（按类缓存）生成"""
+        if self._methods is None:
+            self._methods = _compute_methods_for_class(self._methods_class)
+            self._methods_class = None
+        return self._methods
+    
+    @methods.setter
+    def methods(self, value: Iterable[NodeMethod]) -> None:
+        self._methods = tuple(value)
+        self._methods_class = None
+    
     @staticmethod
     def from_class(cls: Type) -> 'GraphNode':
         """从类对象创建GraphNode实例
@@ -65,162 +157,109 @@ class GraphNode:
         Returns:
             GraphNode: 表示该类的节点
         """
-        # 创建节点
+        # 每次构建新节点（不与其他节点共享可变成员）；继承链、方法反射等按类缓存
         node = GraphNode()
+        node._populate_from_class(cls)
+        return node
+    
+    @staticmethod
+    def from_class_tree(root_cls: Type) -> List['GraphNode']:
+        """为根类及其所有（间接）子类批量创建节点
         
-        # 设置基本信息
-        node.class_name = cls.__name__
-        node.unique_class_name = getattr(cls, 'unique_class_name', cls.__name__)
-        node.node_id = node.unique_class_name
-        node.description = inspect.getdoc(cls) or ""
-        
-        # 解析基类信息
-        for base in cls.__bases__:
-            if base is not object:
-                node.parent_class = base.__name__
-                
-        # 解析继承链
-        chain = []
-        current_cls = cls
-        
-        while current_cls is not object and current_cls is not None:
-            chain.append(current_cls.__name__)
-            bases = current_cls.__bases__
-            if bases and bases[0] is not object:
-                current_cls = bases[0]
-            else:
-                break
-        
-        node.inheritance_chain = list(reversed(chain))
-        node.inheritance_depth = len(node.inheritance_chain)
-        
-        # 尝试实例化（如果可能）来提取属性
-        try:
-            instance = cls()
-            node._extract_attributes(instance)
-            
-            # 收集VLM相关信息
-            if hasattr(instance, 'llm_interface'):
-                node.llm_interface = instance.llm_interface
-            if hasattr(instance, 'visual_recognition'):
-                node.visual_recognition = instance.visual_recognition
-            if hasattr(instance, 'tactical_context'):
-                node.tactical_context = instance.tactical_context
-            
-            # 收集关键战术属性
-            if hasattr(instance, 'strong_against'):
-                node.strong_against = instance.strong_against
-            if hasattr(instance, 'weak_against'):
-                node.weak_against = instance.weak_against
-            if hasattr(instance, 'abilities'):
-                node.abilities = instance.abilities
-            if hasattr(instance, 'upgrades'):
-                node.upgrades = instance.upgrades
-            if hasattr(instance, 'tactical_info'):
-                node.tactical_info = instance.tactical_info
-            
-            # 收集其他元数据
-            if hasattr(instance, 'description'):
-                node.description = instance.description
-            if hasattr(instance, 'race'):
-                node.race = instance.race
-            if hasattr(instance, 'unit_type'):
-                node.unit_type = instance.unit_type
-        except Exception as e:
-            # 实例化失败时，尝试从类中提取静态属性
-            print(f"警告: 无法实例化类 {cls.__name__}，错误: {e}")
+        Args:
+            root_cls: 类层次的根类
             
-            # 尝试从类属性中提取关键信息
-            if hasattr(cls, 'strong_against'):
-                node.strong_against = cls.strong_against
-            if hasattr(cls, 'weak_against'):
-                node.weak_against = cls.weak_against
-        
-        # 提取类方法
-        node._extract_methods(cls)
-        
-        # 尝试提取单位特定的属性
-        node._extract_unit_specific_attributes(cls)
-        
-        return node
+        Returns:
+            List[GraphNode]: 按广度优先顺序排列的节点列表，第一个为根类节点
+        """
+        classes = _all_subclasses(root_cls, Unit._subclass_generation)
+        return [GraphNode.from_class(cls) for cls in classes]
+    
+    @classmethod
+    def clear_cache(cls) -> None:
+        """清空 from_class 使用的按类反射缓存"""
+        _compute_methods_for_class.cache_clear()
+        _cached_signature.cache_clear()
+        _inheritance_chain.cache_clear()
+        _cached_getdoc.cache_clear()
+        _requires_ctor_args.cache_clear()
+        _all_subclasses.cache_clear()
         
-    def _extract_unit_specific_attributes(self, cls: Type):
+    def _extract_unit_specific_attributes(self, cls: Type) -> None:
         """提取单位特定的属性"""
-        # 尝试从类中提取种族信息
+        # 根据模块路径推断种族和单位类型
         if hasattr(cls, '__module__'):
-            if 'terran' in cls.__module__.lower():
-                self.race = 'Terran'
-            elif 'protoss' in cls.__module__.lower():
-                self.race = 'Protoss'
-            elif 'zerg' in cls.__module__.lower():
-                self.race = 'Zerg'
-            
-            # 尝试提取单位类型
-            if 'infantry' in cls.__module__.lower():
-                self.unit_type = 'Infantry'
-            elif 'ground' in cls.__module__.lower():
-                self.unit_type = 'Ground'
-            elif 'air' in cls.__module__.lower():
-                self.unit_type = 'Air'
-    
-    def _build_from_class(self, class_obj) -> None:
-        """从类对象构建节点信息"""
+            race, unit_type = _module_meta(cls.__module__)
+            if race is not None:
+                self.race = race
+            if unit_type is not None:
+                self.unit_type = unit_type
+    
+    def _populate_from_class(self, cls: Type) -> None:
+        """从类对象填充节点信息，供 from_class 和 __init__ 共用"""
         # 设置基本信息
-        self.class_name = class_obj.__name__
-        self.unique_class_name = getattr(class_obj, 'unique_class_name', class_obj.__name__)
+        self.class_name = cls.__name__
+        self.unique_class_name = getattr(cls, 'unique_class_name', cls.__name__)
         self.node_id = self.unique_class_name
+        self.description = _cached_getdoc(cls)
         
-        # 构建继承链
-        inheritance_chain = []
-        cls = class_obj
-        while cls != object:
-            inheritance_chain.append(cls.__name__)
-            cls = cls.__bases__[0] if cls.__bases__ else object
-        inheritance_chain = list(reversed(inheritance_chain))
+        # 解析继承链（沿主基类，按类缓存）
+        chain = _inheritance_chain(cls)
         
-        self.inheritance_chain = inheritance_chain
-        self.inheritance_depth = len(inheritance_chain)
-        self.parent_class = inheritance_chain[-2] if len(inheritance_chain) > 1 else None
+        self.inheritance_chain = chain
+        self.inheritance_depth = len(chain)
+        self.parent_class = chain[-2] if len(chain) > 1 else None
         
-        # 收集属性
-        instance = class_obj()
-        self._extract_attributes(instance)
+        # 实例化类以收集属性和元数据
+        self._populate_from_instance(cls)
         
-        # 收集方法
-        self._extract_methods(class_obj)
+        # 提取类方法
+        self._extract_methods(cls)
         
-        # 收集VLM相关信息
-        if hasattr(instance, 'llm_interface'):
-            self.llm_interface = instance.llm_interface
-        if hasattr(instance, 'visual_recognition'):
-            self.visual_recognition = instance.visual_recognition
-        if hasattr(instance, 'tactical_context'):
-            self.tactical_context = instance.tactical_context
+        # 尝试提取单位特定的属性
+        self._extract_unit_specific_attributes(cls)
+    
+    def _populate_from_instance(self, cls: Type) -> None:
+        """尝试实例化类并从实例中收集属性和元数据"""
+        if _requires_ctor_args(cls):
+            # 构造函数需要参数，无法无参实例化，直接提取静态属性
+            print(f"警告: 类 {cls.__name__} 的构造函数需要参数，跳过实例化")
+            self._populate_from_class_attrs(cls)
+            return
         
-        # 收集其他元数据
-        if hasattr(instance, 'description'):
-            self.description = instance.description
-        if hasattr(instance, 'race'):
-            self.race = instance.race
-        if hasattr(instance, 'unit_type'):
-            self.unit_type = instance.unit_type
-    
-    def _extract_attributes(self, instance) -> None:
-        """从实例中提取属性信息"""
-        attributes = []
+        try:
+            instance = cls()
+        except Exception as e:
+            # 实例化失败时，尝试从类中提取静态属性
+            print(f"警告: 无法实例化类 {cls.__name__}，错误: {e}")
+            self._populate_from_class_attrs(cls)
+            return
         
-        # 获取实例的所有非私有属性
-        for attr_name, attr_value in instance.__dict__.items():
-            if not attr_name.startswith('_'):
-                attr_type = type(attr_value).__name__ if attr_value is not None else "Any"
-                attributes.append(NodeAttribute(
-                    name=attr_name,
-                    data_type=attr_type,
-                    default_value=attr_value,
-                    description=""
-                ))
+        self._extract_attributes(instance)
         
-        self.attributes = attributes
+        # 收集VLM相关信息、关键战术属性和其他元数据
+        # 优先直接查实例字典，只有类属性/property 才走 getattr
+        inst_dict = getattr(instance, '__dict__', {})
+        for name in _COPY_ATTRS:
+            if name in inst_dict:
+                setattr(self, name, inst_dict[name])
+            else:
+                value = getattr(instance, name, _SENTINEL)
+                if value is not _SENTINEL:
+                    setattr(self, name, value)
+    
+    def _populate_from_class_attrs(self, cls: Type) -> None:
+        """无法获得实例时，从类属性中提取关键信息"""
+        for name in ('strong_against', 'weak_against'):
+            value = getattr(cls, name, _SENTINEL)
+            if value is not _SENTINEL:
+                setattr(self, name, value)
+    
+    def _extract_attributes(self, instance: Any) -> None:
+        """从实例中提取属性信息"""
+        # 只保存实例属性的浅拷贝快照，NodeAttribute 列表在首次访问时生成
+        self._raw_instance_dict = dict(instance.__dict__)
+        self._attributes = None
         
         # 提取关键战术属性
         if hasattr(instance, 'strong_against') and hasattr(instance, 'weak_against'):
@@ -237,48 +276,11 @@ class GraphNode:
         if hasattr(instance, 'build_requirements'):
             self.build_requirements = instance.build_requirements
     
-    def _extract_methods(self, class_obj) -> None:
+    def _extract_methods(self, class_obj: Type) -> None:
         """从类中提取方法信息"""
-        methods = []
-        
-        # 获取类的所有非私有方法
-        for method_name, method in inspect.getmembers(class_obj, predicate=inspect.isfunction):
-            if not method_name.startswith('_'):
-                sig = inspect.signature(method)
-                
-                # 提取参数信息
-                params = []
-                for param_name, param in list(sig.parameters.items())[1:]:  # 跳过self参数
-                    param_type = "Any"
-                    if param.annotation != inspect.Parameter.empty:
-                        param_type = param.annotation.__name__ if hasattr(param.annotation, '__name__') else str(param.annotation)
-                    
-                    params.append({
-                        "name": param_name,
-                        "type": param_type
-                    })
-                
-                # 获取返回类型
-                return_type = "None"
-                if sig.return_annotation != inspect.Parameter.empty:
-                    return_type = sig.return_annotation.__name__ if hasattr(sig.return_annotation, '__name__') else str(sig.return_annotation)
-                
-                # 检查是否是重写的方法
-                is_overridden = False
-                for base in class_obj.__bases__:
-                    if base != object and hasattr(base, method_name):
-                        is_overridden = True
-                        break
-                
-                methods.append(NodeMethod(
-                    name=method_name,
-                    return_type=return_type,
-                    parameters=params,
-                    description=inspect.getdoc(method) or "",
-                    is_overridden=is_overridden
-                ))
-        
-        self.methods = methods
+        # 延迟到首次访问 methods 时再生成
+        self._methods_class = class_obj
+        self._methods = None
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典格式"""
@@ -290,25 +292,10 @@ class GraphNode:
             "parent_class": self.parent_class,
             "inheritance_depth": self.inheritance_depth,
             "attributes": [
-                {
-                    "name": attr.name,
-                    "data_type": attr.data_type,
-                    "default_value": attr.default_value,
-                    "description": attr.description,
-                    "is_required": attr.is_required
-                }
+                dict(zip(_ATTR_FIELDS, _ATTR_GETTER(attr)))
                 for attr in self.attributes
             ],
-            "methods": [
-                {
-                    "name": method.name,
-                    "return_type": method.return_type,
-                    "parameters": method.parameters,
-                    "description": method.description,
-                    "is_overridden": method.is_overridden
-                }
-                for method in self.methods
-            ],
+            "methods": [_method_to_dict(method) for method in self.methods],
             "llm_interface": self.llm_interface,
             "visual_recognition": self.visual_recognition,
             "tactical_context": self.tactical_context,
@@ -317,35 +304,65 @@ class GraphNode:
             "unit_type": self.unit_type
         }
     
+    def to_json(self) -> bytes:
+        """序列化为 UTF-8 编码的 JSON
+        
+        安装了 orjson 时直接在 C 层序列化节点字段与属性/方法数据类，
+        不再先经 to_dict 构建中间字典；否则回退为 json.dumps(to_dict())。
+        
+        Returns:
+            bytes: JSON 字节串
+        """
+        if orjson is None:
+            return json.dumps(self.to_dict(), ensure_ascii=False, default=_json_default).encode('utf-8')
+        return orjson.dumps(self, default=_json_default, option=orjson.OPT_NON_STR_KEYS)
+    
+    def fast_to_json(self) -> bytes:
+        """使用导入时按固定字段预编译的序列化器生成紧凑 JSON
+        
+        逐字段填充预先生成的模板，不构建 to_dict 的中间字典，也不依赖 orjson。
+        
+        Returns:
+            bytes: UTF-8 编码的 JSON 字节串
+        """
+        return _serialize_node(self).encode('utf-8')
+    
+    def iter_serialize(self, writer: IO[str]) -> None:
+        """将节点以 JSON 分块写入 writer，不在内存中拼接完整字符串
+        
+        Args:
+            writer: 可写的文本文件对象
+        """
+        write = writer.write
+        for chunk in _STREAM_ENCODER.iterencode(self.to_dict()):
+            write(chunk)
+    
+    @staticmethod
+    def dump_nodes(nodes: Iterable['GraphNode'], writer: IO[str]) -> None:
+        """将多个节点流式写为 JSON 数组，峰值内存只与单个节点相关
+        
+        Args:
+            nodes: 节点可迭代对象（可为生成器）
+            writer: 可写的文本文件对象
+        """
+        writer.write('[')
+        first = True
+        for node in nodes:
+            if not first:
+                writer.write(',')
+            first = False
+            node.iter_serialize(writer)
+        writer.write(']')
+    
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'GraphNode':
         """从字典创建节点"""
-        # 重新构建属性对象
-        attributes = [
-            NodeAttribute(
-                name=attr["name"],
-                data_type=attr["data_type"],
-                default_value=attr["default_value"],
-                description=attr["description"],
-                is_required=attr["is_required"]
-            )
-            for attr in data.get("attributes", [])
-        ]
-        
-        # 重新构建方法对象
-        methods = [
-            NodeMethod(
-                name=method["name"],
-                return_type=method["return_type"],
-                parameters=method["parameters"],
-                description=method["description"],
-                is_overridden=method["is_overridden"]
-            )
-            for method in data.get("methods", [])
-        ]
+        # 重新构建属性与方法对象（输入为受信任的 to_dict 输出，跳过数据类 __init__）
+        attributes = tuple(_attribute_from_dict(attr) for attr in data.get("attributes", []))
+        methods = tuple(_method_from_dict(method) for method in data.get("methods", []))
         
         # 创建节点实例
-        return cls(
+        node = cls(
             node_id=data.get("node_id", ""),
             class_name=data.get("class_name", ""),
             unique_class_name=data.get("unique_class_name", ""),
@@ -360,4 +377,299 @@ class GraphNode:
             description=data.get("description", ""),
             race=data.get("race", "Unknown"),
             unit_type=data.get("unit_type", "Abstract")
-        )
\ No newline at end of file
+        )
+        
+        return node
+
+
+# 模块路径 -> (种族, 单位类型) 映射缓存，未识别的部分为 None
+_MODULE_META_CACHE: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+
+
+def _module_meta(module: str) -> Tuple[Optional[str], Optional[str]]:
+    """根据模块路径解析种族和单位类型（每个模块只解析一次）"""
+    meta = _MODULE_META_CACHE.get(module)
+    if meta is not None:
+        return meta
+    
+    module_lower = module.lower()
+    
+    # 提取种族信息
+    race = None
+    if 'terran' in module_lower:
+        race = 'Terran'
+    elif 'protoss' in module_lower:
+        race = 'Protoss'
+    elif 'zerg' in module_lower:
+        race = 'Zerg'
+    
+    # 提取单位类型
+    unit_type = None
+    if 'infantry' in module_lower:
+        unit_type = 'Infantry'
+    elif 'ground' in module_lower:
+        unit_type = 'Ground'
+    elif 'air' in module_lower:
+        unit_type = 'Air'
+    
+    meta = (
+        _intern(race) if race is not None else None,
+        _intern(unit_type) if unit_type is not None else None,
+    )
+    _MODULE_META_CACHE[module] = meta
+    return meta
+
+
+@functools.lru_cache(maxsize=512)
+def _inheritance_chain(cls: Type) -> Tuple[str, ...]:
+    """沿主基类（__bases__[0]）构建继承链，从根类到当前类
+    
+    不直接使用 __mro__：多继承时 __mro__ 会混入 GroundUnit/AirUnit 等混入类。
+    递归结果按类缓存，同一基类下的兄弟类共享祖先部分。
+    """
+    bases = cls.__bases__
+    if bases and bases[0] is not object:
+        return _inheritance_chain(bases[0]) + (cls.__name__,)
+    return (cls.__name__,)
+
+
+def _method_to_dict(method: NodeMethod) -> Dict[str, Any]:
+    """将 NodeMethod 转换为字典，参数展开为 {"name", "type"} 字典列表"""
+    entry = dict(zip(_METHOD_FIELDS, _METHOD_GETTER(method)))
+    entry["parameters"] = [{"name": param.name, "type": param.type} for param in method.parameters]
+    return entry
+
+
+def _json_default(obj: Any) -> Any:
+    """to_json 的兜底序列化：处理节点本身、方法参数及其他自定义对象"""
+    if isinstance(obj, GraphNode):
+        return {
+            "node_id": obj.node_id,
+            "class_name": obj.class_name,
+            "unique_class_name": obj.unique_class_name,
+            "inheritance_chain": obj.inheritance_chain,
+            "parent_class": obj.parent_class,
+            "inheritance_depth": obj.inheritance_depth,
+            "attributes": obj.attributes,
+            "methods": obj.methods,
+            "llm_interface": obj.llm_interface,
+            "visual_recognition": obj.visual_recognition,
+            "tactical_context": obj.tactical_context,
+            "description": obj.description,
+            "race": obj.race,
+            "unit_type": obj.unit_type
+        }
+    if isinstance(obj, Param):
+        return {"name": obj.name, "type": obj.type}
+    if is_dataclass(obj) and not isinstance(obj, type):
+        return asdict(obj)
+    if hasattr(obj, '__dict__'):
+        return obj.__dict__
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# 流式序列化使用的编码器（无缩进，保留中文）
+_STREAM_ENCODER = json.JSONEncoder(ensure_ascii=False, default=_json_default)
+
+
+def _compile_serializer(fields: Tuple[str, ...],
+                        encoders: Optional[Dict[str, Callable[[Any], str]]] = None) -> Callable[[Any], str]:
+    """按固定字段列表预编译对象的 JSON 序列化函数
+    
+    键名在编译时一次性编码进模板，并为字段列表生成逐字段展开的专用函数。
+    
+    Args:
+        fields: 按输出顺序排列的字段名
+        encoders: 特定字段的编码函数，未指定的字段使用通用 JSON 编码
+        
+    Returns:
+        Callable: 接收对象、返回 JSON 字符串的函数
+    """
+    template = '{' + ','.join(f'{json.dumps(field)}:%s' for field in fields) + '}'
+    namespace: Dict[str, Any] = {'_template': template}
+    parts = []
+    for i, field in enumerate(fields):
+        namespace[f'_enc{i}'] = (encoders or {}).get(field, _encode_value)
+        parts.append(f'_enc{i}(obj.{field})')
+    
+    # 生成逐字段展开的专用函数，避免运行时的循环与元组解包
+    source = f"def serialize(obj):\n    return _template % ({', '.join(parts)},)\n"
+    exec(compile(source, f'<serializer {",".join(fields)}>', 'exec'), namespace)
+    return namespace['serialize']
+
+
+def _list_encoder(item_serializer: Callable[[Any], str]) -> Callable[[Any], str]:
+    """生成将对象列表编码为 JSON 数组的函数"""
+    def encode(items: Any) -> str:
+        return '[' + ','.join(map(item_serializer, items)) + ']'
+    return encode
+
+
+# 通用值编码（紧凑分隔符，保留中文）
+_encode_json = json.JSONEncoder(ensure_ascii=False, separators=(',', ':'), default=_json_default).encode
+_encode_str = json.encoder.encode_basestring
+_SCALAR_LITERALS = {None: 'null', True: 'true', False: 'false'}
+
+
+def _encode_value(value: Any) -> str:
+    """编码单个字段值：字符串/整数/常量走快速路径，其余交给 JSONEncoder"""
+    value_type = value.__class__
+    if value_type is str:
+        return _encode_str(value)
+    if value_type is int:
+        return int.__repr__(value)
+    if value is None or value_type is bool:
+        return _SCALAR_LITERALS[value]
+    return _encode_json(value)
+
+_NODE_FIELDS: Tuple[str, ...] = (
+    'node_id', 'class_name', 'unique_class_name', 'inheritance_chain', 'parent_class',
+    'inheritance_depth', 'attributes', 'methods', 'llm_interface', 'visual_recognition',
+    'tactical_context', 'description', 'race', 'unit_type',
+)
+
+_serialize_attribute = _compile_serializer(_ATTR_FIELDS)
+_serialize_param = _compile_serializer(Param._fields)
+_serialize_method = _compile_serializer(
+    _METHOD_FIELDS, {'parameters': _list_encoder(_serialize_param)}
+)
+_serialize_node = _compile_serializer(_NODE_FIELDS, {
+    'attributes': _list_encoder(_serialize_attribute),
+    'methods': _list_encoder(_serialize_method),
+})
+
+
+_new_object = object.__new__
+
+
+def _attribute_from_dict(data: Dict[str, Any]) -> NodeAttribute:
+    """由 to_dict 输出的字典直接构建 NodeAttribute，绕过数据类 __init__"""
+    attr = _new_object(NodeAttribute)
+    attr.name = data["name"]
+    attr.data_type = data["data_type"]
+    attr.default_value = data["default_value"]
+    attr.description = data["description"]
+    attr.is_required = data["is_required"]
+    return attr
+
+
+def _method_from_dict(data: Dict[str, Any]) -> NodeMethod:
+    """由 to_dict 输出的字典直接构建 NodeMethod，绕过数据类 __init__"""
+    method = _new_object(NodeMethod)
+    method.name = data["name"]
+    method.return_type = data["return_type"]
+    method.parameters = [Param(param["name"], param["type"]) for param in data["parameters"]]
+    method.description = data["description"]
+    method.is_overridden = data["is_overridden"]
+    return method
+
+
+def _build_attributes(instance_dict: Dict[str, Any]) -> Tuple[NodeAttribute, ...]:
+    """由实例属性字典生成非私有属性的 NodeAttribute 列表"""
+    attributes: List[NodeAttribute] = []
+    
+    # 获取实例的所有非私有属性
+    for attr_name, attr_value in instance_dict.items():
+        if not attr_name.startswith('_'):
+            attr_type = type(attr_value).__name__ if attr_value is not None else "Any"
+            attributes.append(NodeAttribute(
+                name=_intern(attr_name),
+                data_type=_intern(attr_type),
+                default_value=attr_value,
+                description=""
+            ))
+    
+    return tuple(attributes)
+
+
+@functools.lru_cache(maxsize=128)
+def _all_subclasses(root: Type, generation: int) -> Tuple[Type, ...]:
+    """广度优先收集根类及其所有子类（多继承下去重）
+    
+    generation 取自 Unit._subclass_generation，定义新的单位子类后缓存自动失效。
+    """
+    seen = {root}
+    ordered = [root]
+    queue = collections.deque([root])
+    while queue:
+        for sub in queue.popleft().__subclasses__():
+            if sub not in seen:
+                seen.add(sub)
+                ordered.append(sub)
+                queue.append(sub)
+    return tuple(ordered)
+
+
+@functools.lru_cache(maxsize=512)
+def _requires_ctor_args(cls: Type) -> bool:
+    """判断类的构造函数是否有必填参数（按类缓存）"""
+    try:
+        sig = inspect.signature(cls)
+    except (TypeError, ValueError):
+        # 无法获取签名时照常尝试实例化
+        return False
+    
+    for param in sig.parameters.values():
+        if param.default is _EMPTY and param.kind in _REQUIRED_KINDS:
+            return True
+    return False
+
+
+@functools.lru_cache(maxsize=2048)
+def _cached_getdoc(obj: Any) -> str:
+    """缓存类/方法的文档字符串（getdoc 会遍历 MRO 并规范化缩进）"""
+    return inspect.getdoc(obj) or ""
+
+
+@functools.lru_cache(maxsize=2048)
+def _cached_signature(method: Callable[..., Any]) -> inspect.Signature:
+    """缓存方法签名，避免对共享基类方法重复解析"""
+    return inspect.signature(method)
+
+
+@functools.lru_cache(maxsize=512)
+def _compute_methods_for_class(class_obj: Type) -> Tuple[NodeMethod, ...]:
+    """提取类的所有非私有方法信息（按类缓存）
+    
+    同一个类（或共享基类的多个单位）重复构建节点时，直接复用反射结果。
+    """
+    methods: List[NodeMethod] = []
+    
+    # 所有祖先类（不含 object）中定义过的名字，用于判断方法是否重写
+    ancestor_names = set().union(*(vars(base).keys() for base in class_obj.__mro__[1:-1]))
+    
+    # 获取类的所有非私有方法
+    for method_name, method in inspect.getmembers(class_obj, predicate=inspect.isfunction):
+        if not method_name.startswith('_'):
+            sig = _cached_signature(method)
+            
+            # 提取参数信息
+            params: List[Param] = []
+            for param_name, param in list(sig.parameters.items())[1:]:  # 跳过self参数
+                param_type = "Any"
+                annotation = param.annotation
+                if annotation is not _EMPTY:
+                    ann_name = getattr(annotation, '__name__', None)
+                    param_type = ann_name if ann_name is not None else str(annotation)
+                
+                params.append(Param(_intern(param_name), _intern(param_type)))
+            
+            # 获取返回类型
+            return_type = "None"
+            return_annotation = sig.return_annotation
+            if return_annotation is not _EMPTY_RET:
+                ann_name = getattr(return_annotation, '__name__', None)
+                return_type = ann_name if ann_name is not None else str(return_annotation)
+            
+            # 检查是否是重写的方法
+            is_overridden = method_name in ancestor_names
+            
+            methods.append(NodeMethod(
+                name=_intern(method_name),
+                return_type=_intern(return_type),
+                parameters=params,
+                description=_cached_getdoc(method),
+                is_overridden=is_overridden
+            ))
+    
+    return tuple(methods)
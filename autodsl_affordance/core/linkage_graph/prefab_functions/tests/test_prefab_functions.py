@@ -6,6 +6,7 @@
 
 import os
 import sys
+import copy
 import json
 import tempfile
 import unittest
@@ -24,16 +25,17 @@ from autodsl_affordance.core.linkage_graph.manager.prefab_function_manager impor
 class TestPrefabFunctionSystem(unittest.TestCase):
     """预制函数系统测试类"""
     
-    def setUp(self):
-        """设置测试环境"""
+    @classmethod
+    def setUpClass(cls):
+        """设置所有测试共享的环境（临时目录与测试文件只创建一次）"""
         # 创建临时目录
-        self.temp_dir = tempfile.mkdtemp()
+        cls.temp_dir = tempfile.mkdtemp()
         
         # 预制函数 Schema 路径
-        self.schema_path = os.path.join(current_dir, '../schema/prefab_function.schema.json')
+        cls.schema_path = os.path.join(current_dir, '../schema/prefab_function.schema.json')
         
         # 示例预制函数
-        self.example_function = {
+        cls.example_function = {
             "function_id": "TEST_INTERACTION_001",
             "function_type": "interaction",
             "name": "test_focus_fire",
@@ -56,14 +58,19 @@ class TestPrefabFunctionSystem(unittest.TestCase):
         }
         
         # 创建测试用的预制函数文件
-        self.test_file_path = os.path.join(self.temp_dir, 'test_prefab_functions.json')
-        with open(self.test_file_path, 'w', encoding='utf-8') as f:
-            json.dump([self.example_function], f, ensure_ascii=False, indent=2)
+        cls.test_file_path = os.path.join(cls.temp_dir, 'test_prefab_functions.json')
+        with open(cls.test_file_path, 'w', encoding='utf-8') as f:
+            json.dump([cls.example_function], f, ensure_ascii=False, indent=2)
     
-    def tearDown(self):
+    @classmethod
+    def tearDownClass(cls):
         """清理测试环境"""
         import shutil
-        shutil.rmtree(self.temp_dir)
+        shutil.rmtree(cls.temp_dir)
+    
+    def setUp(self):
+        """每个测试使用示例函数的独立副本，避免测试间相互影响"""
+        self.example_function = copy.deepcopy(type(self).example_function)
     
     def test_schema_validator(self):
         """测试 Schema 验证器"""
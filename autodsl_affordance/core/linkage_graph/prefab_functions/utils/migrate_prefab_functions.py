@@ -5,9 +5,13 @@
 用于将现有的预制函数转换为新的格式，按链接类型组织并标准化字段
 """
 
-import json
+import logging
 import os
+import pickle
+import re
 import sys
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 
 # 添加项目根目录到 Python 路径
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -16,16 +20,78 @@ sys.path.append(project_root)
 
 # 直接导入 schema_validator 模块
 sys.path.append(os.path.dirname(current_dir))
-from schema_validator import PrefabFunctionSchemaValidator
+from schema_validator import PrefabFunctionSchemaValidator, _dumps, _read_json, configure_cli_logging
+
+logger = logging.getLogger(__name__)
+
+# 合法的枚举值
+_VALID_FUNCTION_TYPES = frozenset({
+    'interaction', 'combination', 'association', 'invocation', 'dependency'
+})
+_VALID_TACTIC_CATEGORIES = frozenset({
+    'offense', 'defense', 'support', 'heterogeneous_coordination',
+    'air_ground_coordination', 'long_short_range_coordination',
+    'stealth_synergy', 'armor_type_coordination',
+    'target_priority_coordination', 'mobility_control_coordination',
+    'formation_control_coordination'
+})
+_VALID_EXECUTION_TYPES = frozenset({
+    'attack', 'ability', 'move', 'coordinated_advance',
+    'combined_assault', 'fortified_position', 'ambush_attack',
+    'frontal_assault', 'focused_assault', 'mobile_defense',
+    'spread_formation', 'hit_and_run', 'concurrent',
+    'sequential', 'parallel'
+})
+
+# 链接类型到函数 ID 中使用的规范名称
+_LINKAGE_CANON = {
+    'interaction': 'INTERACTION',
+    'combination': 'COMBINATION',
+    'association': 'ASSOCIATION',
+    'invocation': 'INVOCATION',
+    'dependency': 'DEPENDENCY',
+    'synergy': 'SYNERGY',
+    'advanced_synergy': 'SYNERGY',
+}
+
+# 驻留的默认值，迁移后的函数共享同一个字符串对象
+_intern = sys.intern
+_OFFENSE = _intern('offense')
+_ATTACK = _intern('attack')
+_INTERACTION = _intern('interaction')
+
+# 枚举字段 -> (合法取值, 非法时使用的默认值)
+_ENUM_FIXERS = {
+    'function_type': (_VALID_FUNCTION_TYPES, _INTERACTION),  # 默认函数类型
+    'tactic_category': (_VALID_TACTIC_CATEGORIES, _OFFENSE),  # 默认战术类别
+    'execution_type': (_VALID_EXECUTION_TYPES, _ATTACK),  # 默认执行类型
+}
+
+# 必要字段的默认值：(字段名, 根据函数字典生成默认值的函数)
+_REQUIRED_DEFAULTS = (
+    ('strategy_description', lambda f: f.get('description', '')),
+    ('tactic_category', lambda f: _OFFENSE),  # 默认战术类别
+    ('linkage_type', lambda f: f.get('function_type', _INTERACTION)),
+    ('execution_type', lambda f: _ATTACK),  # 默认执行类型
+    ('execution_flow', lambda f: []),  # 默认空执行流程
+)
 
 class PrefabFunctionMigrator:
     """预制函数迁移器"""
     
-    def __init__(self):
+    # 从函数 ID / 名称中识别种族
+    _RACE_RE = re.compile(r'TERRAN|PROTOSS|ZERG')
+    
+    def __init__(self, validator=None):
         """
         初始化迁移器
+        
+        Args:
+            validator: 共享的 Schema 验证器，为 None 时创建一个使用默认 Schema 的验证器
         """
-        self.validator = PrefabFunctionSchemaValidator()
+        self.validator = validator or PrefabFunctionSchemaValidator()
+        # 迁移时被补全或修正过、需要重新验证的函数
+        self._needs_validation = []
         self.linkage_types = {
             'interaction': 'INTERACTION',
             'combination': 'COMBINATION',
@@ -34,13 +100,15 @@ class PrefabFunctionMigrator:
             'dependency': 'DEPENDENCY'
         }
     
-    def migrate_file(self, input_path, output_path):
+    def migrate_file(self, input_path, output_path, skip_validation=False):
         """
         迁移单个预制函数文件
         
         Args:
             input_path: 输入文件路径
             output_path: 输出文件路径
+            skip_validation: 是否信任迁移结果，只重新验证迁移时被补全或修正过的函数。
+                仅用于已知除缺失字段外都符合 Schema 的输入
             
         Returns:
             bool: 迁移是否成功
@@ -49,8 +117,7 @@ class PrefabFunctionMigrator:
         
         try:
             # 读取输入文件
-            with open(input_path, 'r', encoding='utf-8') as f:
-                original_functions = json.load(f)
+            original_functions = _read_json(input_path)
             
             print(f"读取了 {len(original_functions)} 个原始预制函数")
             
@@ -60,13 +127,14 @@ class PrefabFunctionMigrator:
             print(f"迁移后得到 {len(migrated_functions)} 个预制函数")
             
             # 验证迁移后的数据
-            if not self._validate_functions(migrated_functions):
+            migrated_functions = self._validate_functions(migrated_functions, skip_validation)
+            if not migrated_functions:
                 print("✗ 迁移后的数据验证失败")
                 return False
             
             # 保存输出文件
-            with open(output_path, 'w', encoding='utf-8') as f:
-                json.dump(migrated_functions, f, ensure_ascii=False, indent=2)
+            with open(output_path, 'wb') as f:
+                f.write(_dumps(migrated_functions))
             
             print(f"✓ 迁移成功: {output_path}")
             return True
@@ -79,168 +147,113 @@ class PrefabFunctionMigrator:
         迁移函数列表
         
         Args:
-            functions: 原始函数列表
+            functions: 原始函数列表（其中的函数会被原地修改）
             
         Returns:
             list: 迁移后的函数列表
         """
-        migrated = []
+        self._needs_validation = []
+        
+        # 预分配结果列表，循环外取出绑定方法
+        migrated = [None] * len(functions)
+        count = 0
+        migrate_function = self._migrate_function
         
         for func in functions:
             try:
-                migrated_func = self._migrate_function(func)
-                if migrated_func:
-                    migrated.append(migrated_func)
+                migrated_func = migrate_function(func)
             except Exception as e:
-                print(f"✗ 迁移函数失败 {func.get('function_id', 'unknown')}: {e}")
+                logger.debug("✗ 迁移函数失败 %s: %s", func.get('function_id', 'unknown'), e)
+                continue
+            if migrated_func:
+                migrated[count] = migrated_func
+                count += 1
         
+        del migrated[count:]
         return migrated
     
     def _migrate_function(self, func):
         """
         迁移单个函数
         
+        直接原地修改传入的函数字典，不再复制；调用方如需保留原始数据，
+        应在传入前自行复制。
+        
         Args:
             func: 原始函数
             
         Returns:
-            dict: 迁移后的函数
+            dict: 迁移后的函数（即传入的 func）
         """
-        # 创建迁移后的函数
-        migrated_func = func.copy()
-        
-        # 标准化字段
-        self._standardize_fields(migrated_func)
-        
-        # 按链接类型组织
-        self._organize_by_linkage_type(migrated_func)
-        
-        # 标准化函数 ID
-        self._standardize_function_id(migrated_func)
+        # 一次遍历完成字段标准化、按链接类型组织和函数 ID 标准化
+        if self._transform(func):
+            self._needs_validation.append(func)
         
-        return migrated_func
+        return func
     
-    def _standardize_fields(self, func):
+    def _transform(self, func):
         """
-        标准化字段
+        标准化单个函数（原地修改）
+        
+        依次完成：移除冗余字段、补全必要字段、标准化枚举值、
+        按 function_type 设置 linkage_type、为缺失 ID 的函数生成 ID。
+        每个键只读取一次。
         
         Args:
             func: 函数字典
+            
+        Returns:
+            bool: 是否补全或修正了字段
         """
-        # 移除冗余字段
+        get = func.get
+        function_id = get('function_id', '')
+        changed = False
+        
+        # 移除冗余字段：保留 linkage_type，移除 synergy_type
         if 'synergy_type' in func and 'linkage_type' in func:
-            # 保留 link_type，移除 synergy_type
             del func['synergy_type']
         
-        # 确保必要字段存在
-        required_fields = [
-            'function_id', 'function_type', 'name', 'description',
-            'strategy_description', 'tactic_category', 'linkage_type',
-            'execution_type', 'execution_flow'
-        ]
-        
-        for field in required_fields:
+        # 为缺失的必要字段设置默认值（linkage_type 默认取 function_type）
+        for field, default in _REQUIRED_DEFAULTS:
             if field not in func:
-                # 为缺失的字段设置默认值
-                if field == 'strategy_description':
-                    func[field] = func.get('description', '')
-                elif field == 'tactic_category':
-                    func[field] = 'offense'  # 默认战术类别
-                elif field == 'linkage_type':
-                    func[field] = func.get('function_type', 'interaction')
-                elif field == 'execution_type':
-                    func[field] = 'attack'  # 默认执行类型
-                elif field == 'execution_flow':
-                    func[field] = []  # 默认空执行流程
-        
-        # 标准化枚举值
-        self._standardize_enums(func)
-    
-    def _standardize_enums(self, func):
-        """
-        标准化枚举值
-        
-        Args:
-            func: 函数字典
-        """
-        # 标准化 function_type
-        valid_function_types = ['interaction', 'combination', 'association', 'invocation', 'dependency']
-        if func.get('function_type') not in valid_function_types:
-            func['function_type'] = 'interaction'  # 默认函数类型
-        
-        # 标准化 tactic_category
-        valid_tactic_categories = [
-            'offense', 'defense', 'support', 'heterogeneous_coordination',
-            'air_ground_coordination', 'long_short_range_coordination',
-            'stealth_synergy', 'armor_type_coordination',
-            'target_priority_coordination', 'mobility_control_coordination',
-            'formation_control_coordination'
-        ]
-        if func.get('tactic_category') not in valid_tactic_categories:
-            func['tactic_category'] = 'offense'  # 默认战术类别
-        
-        # 标准化 execution_type
-        valid_execution_types = [
-            'attack', 'ability', 'move', 'coordinated_advance',
-            'combined_assault', 'fortified_position', 'ambush_attack',
-            'frontal_assault', 'focused_assault', 'mobile_defense',
-            'spread_formation', 'hit_and_run', 'concurrent',
-            'sequential', 'parallel'
-        ]
-        if func.get('execution_type') not in valid_execution_types:
-            func['execution_type'] = 'attack'  # 默认执行类型
-    
-    def _organize_by_linkage_type(self, func):
-        """
-        按链接类型组织
-        
-        Args:
-            func: 函数字典
-        """
-        # 根据 function_type 设置 linkage_type
-        if 'function_type' in func and 'linkage_type' not in func:
-            func['linkage_type'] = func['function_type']
-    
-    def _standardize_function_id(self, func):
-        """
-        标准化函数 ID
-        
-        Args:
-            func: 函数字典
-        """
-        function_id = func.get('function_id', '')
-        
-        # 提取种族信息
-        race = 'UNKNOWN'
-        if 'TERRAN' in function_id:
-            race = 'TERRAN'
-        elif 'PROTOSS' in function_id:
-            race = 'PROTOSS'
-        elif 'ZERG' in function_id:
-            race = 'ZERG'
-        
-        # 提取链接类型
-        linkage_type = func.get('linkage_type', 'interaction').upper()
-        if linkage_type == 'ADVANCED_SYNERGY':
-            linkage_type = 'SYNERGY'
+                func[field] = default(func)
+                changed = True
+        
+        # 标准化枚举值，合法值驻留后共享；合法值均为字符串，非字符串（含列表等不可哈希值）直接使用默认值
+        for field, (valid_values, default) in _ENUM_FIXERS.items():
+            value = get(field)
+            if not isinstance(value, str) or value not in valid_values:
+                func[field] = default
+                changed = True
+            else:
+                func[field] = _intern(value)
         
-        # 生成新的函数 ID
-        # 注意：这里简化处理，实际应该根据序号生成
-        # 为了保持兼容性，我们保留原始 ID，但确保格式正确
+        # 标准化函数 ID
+        # 为了保持兼容性，保留原始 ID，只为没有 ID 的函数生成一个
         if not function_id:
-            # 如果没有 ID，生成一个
-            import uuid
-            func['function_id'] = f"{race}_{linkage_type}_{str(uuid.uuid4())[:8].upper()}"
+            raw_linkage_type = func['linkage_type']
+            linkage_type = _LINKAGE_CANON.get(raw_linkage_type)
+            if linkage_type is None:
+                # 不在常见取值中时才转换大小写
+                linkage_type = raw_linkage_type.upper()
+                if linkage_type == 'ADVANCED_SYNERGY':
+                    linkage_type = 'SYNERGY'
+            # ID 为空，无法从中识别种族
+            func['function_id'] = f"UNKNOWN_{linkage_type}_{uuid.uuid4().hex[:8].upper()}"
+            changed = True
+        
+        return changed
     
-    def _validate_functions(self, functions):
+    def _validate_functions(self, functions, skip_validation=False):
         """
         验证函数列表
         
         Args:
             functions: 函数列表
+            skip_validation: 是否只验证迁移时被补全或修正过的函数，其余视为通过
             
         Returns:
-            bool: 至少有一个函数验证成功
+            list: 验证成功的函数列表，没有函数通过或验证出错时为空列表或 None
         """
         success_count = 0
         failure_count = 0
@@ -248,27 +261,27 @@ class PrefabFunctionMigrator:
         try:
             # 创建一个新的列表，只包含验证成功的函数
             valid_functions = []
+            verbose = logger.isEnabledFor(logging.DEBUG)
+            flagged = None
+            if skip_validation:
+                flagged = {id(func) for func in self._needs_validation}
             
             for func in functions:
-                if self.validator.validate_function(func):
+                if (flagged is not None and id(func) not in flagged) or self.validator.validate_function(func):
                     valid_functions.append(func)
                     success_count += 1
                 else:
-                    print(f"✗ 函数验证失败，将被跳过: {func.get('function_id')}")
+                    if verbose:
+                        logger.debug("✗ 函数验证失败，将被跳过: %s", func.get('function_id'))
                     failure_count += 1
             
-            # 替换原始函数列表为只包含验证成功的函数
-            functions.clear()
-            functions.extend(valid_functions)
-            
             print(f"\n验证结果: 成功 {success_count}, 失败 {failure_count}")
-            print(f"保留了 {len(functions)} 个有效函数")
+            print(f"保留了 {len(valid_functions)} 个有效函数")
             
-            # 只要有至少一个函数成功，就返回 True
-            return len(functions) > 0
+            return valid_functions
         except Exception as e:
             print(f"✗ 验证失败: {e}")
-            return False
+            return None
     
     def _fix_validation_errors(self, func):
         """
@@ -283,40 +296,18 @@ class PrefabFunctionMigrator:
         fixed_func = func.copy()
         
         # 确保所有必要字段存在
-        required_fields = [
-            'function_id', 'function_type', 'name', 'description',
-            'strategy_description', 'tactic_category', 'linkage_type',
-            'execution_type', 'execution_flow'
-        ]
-        
-        for field in required_fields:
+        if 'function_id' not in fixed_func:
+            # 生成一个唯一的函数 ID
+            match = self._RACE_RE.search(str(fixed_func.get('name', '')).upper())
+            race = match.group() if match else 'UNKNOWN'
+            fixed_func['function_id'] = f"{race}_FIXED_{uuid.uuid4().hex[:8].upper()}"
+        for field, default in _REQUIRED_DEFAULTS:
             if field not in fixed_func:
-                if field == 'function_id':
-                    # 生成一个唯一的函数 ID
-                    import uuid
-                    race = 'UNKNOWN'
-                    if 'TERRAN' in str(fixed_func.get('name', '').upper()):
-                        race = 'TERRAN'
-                    elif 'PROTOSS' in str(fixed_func.get('name', '').upper()):
-                        race = 'PROTOSS'
-                    elif 'ZERG' in str(fixed_func.get('name', '').upper()):
-                        race = 'ZERG'
-                    fixed_func['function_id'] = f"{race}_FIXED_{str(uuid.uuid4())[:8].upper()}"
-                elif field == 'strategy_description':
-                    fixed_func[field] = fixed_func.get('description', '')
-                elif field == 'tactic_category':
-                    fixed_func[field] = 'offense'
-                elif field == 'linkage_type':
-                    fixed_func[field] = fixed_func.get('function_type', 'interaction')
-                elif field == 'execution_type':
-                    fixed_func[field] = 'attack'
-                elif field == 'execution_flow':
-                    fixed_func[field] = []
+                fixed_func[field] = default(fixed_func)
         
         # 确保 function_type 是有效的
-        valid_function_types = ['interaction', 'combination', 'association', 'invocation', 'dependency']
-        if fixed_func.get('function_type') not in valid_function_types:
-            fixed_func['function_type'] = 'interaction'
+        if fixed_func.get('function_type') not in _VALID_FUNCTION_TYPES:
+            fixed_func['function_type'] = _INTERACTION
         
         return fixed_func
     
@@ -332,22 +323,21 @@ class PrefabFunctionMigrator:
         """
         print(f"\n迁移目录: {directory}")
         
-        success_count = 0
-        failure_count = 0
-        
-        # 迁移每个种族的文件
-        for race in ['protoss', 'terran', 'zerg']:
-            input_file = os.path.join(directory, f'{race}_prefab_functions.json')
-            output_file = os.path.join(directory, f'{race}_prefab_functions.json')  # 覆盖原文件
-            
-            if os.path.exists(input_file):
-                if self.migrate_file(input_file, output_file):
-                    success_count += 1
-                else:
-                    failure_count += 1
-            else:
-                print(f"✗ 文件不存在: {input_file}")
-                failure_count += 1
+        # 各种族的文件相互独立，在进程池中并行迁移，工作进程使用本迁移器的验证器
+        races = ['protoss', 'terran', 'zerg']
+        try:
+            pickle.dumps(self.validator)
+        except Exception:
+            # 注入的验证器无法传给工作进程时，在当前进程中依次迁移
+            results = [_migrate_one_race(race, directory, self.validator) for race in races]
+        else:
+            with ProcessPoolExecutor(max_workers=len(races)) as executor:
+                results = list(executor.map(
+                    _migrate_one_race, races, [directory] * len(races), [self.validator] * len(races)
+                ))
+        
+        success_count = sum(results)
+        failure_count = len(results) - success_count
         
         print(f"\n迁移完成:")
         print(f"  成功: {success_count} 个文件")
@@ -355,8 +345,31 @@ class PrefabFunctionMigrator:
         
         return failure_count == 0
 
+def _migrate_one_race(race, directory, validator=None):
+    """
+    迁移单个种族的预制函数文件（通常在工作进程中执行）
+    
+    Args:
+        race: 种族名称
+        directory: 目录路径
+        validator: Schema 验证器，为 None 时使用默认 Schema
+        
+    Returns:
+        bool: 迁移是否成功
+    """
+    input_file = os.path.join(directory, f'{race}_prefab_functions.json')
+    output_file = os.path.join(directory, f'{race}_prefab_functions.json')  # 覆盖原文件
+    
+    if not os.path.exists(input_file):
+        print(f"✗ 文件不存在: {input_file}")
+        return False
+    migrator = PrefabFunctionMigrator(validator)
+    return migrator.migrate_file(input_file, output_file)
+
 def main():
     """主函数"""
+    # 设置 AUTODSL_MIGRATE_VERBOSE 环境变量后输出逐函数明细
+    configure_cli_logging('AUTODSL_MIGRATE_VERBOSE')
     migrator = PrefabFunctionMigrator()
     
     # 迁移默认目录中的预制函数文件
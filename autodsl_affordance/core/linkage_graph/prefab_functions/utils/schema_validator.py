@@ -5,10 +5,176 @@ JSON Schema 验证工具
 用于验证预制函数的结构是否符合定义的 Schema
 """
 
+import collections
+import functools
 import json
+import logging
+import mmap
 import os
 import sys
-from jsonschema import validate, ValidationError
+from jsonschema import Draft7Validator
+
+# 逐个函数的明细只在 DEBUG 级别通过日志输出，文件级的报告与汇总仍直接打印
+logger = logging.getLogger(__name__)
+
+
+def configure_cli_logging(verbose_env):
+    """
+    配置命令行入口的日志输出：设置了 verbose_env 环境变量时输出 DEBUG 级别的逐函数明细
+    
+    Args:
+        verbose_env: 开启详细输出的环境变量名
+    """
+    level = logging.DEBUG if os.environ.get(verbose_env) else logging.INFO
+    logging.basicConfig(level=level, format='%(message)s')
+
+try:
+    import orjson
+except ImportError:
+    # 未安装 orjson 时回退到标准库 json
+    orjson = None  # type: ignore[assignment]
+
+if orjson is not None:
+    _loads = orjson.loads
+
+    def _dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+else:
+    _loads = json.loads
+
+    def _dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, indent=2).encode('utf-8')
+
+# 超过该大小的文件通过 mmap 交给 orjson 解析，避免整体读入再复制一次
+_MMAP_THRESHOLD = 1024 * 1024
+
+
+def _read_json(file_path):
+    """
+    读取并解析 JSON 文件
+    
+    Args:
+        file_path: 文件路径
+        
+    Returns:
+        解析后的 JSON 数据
+    """
+    with open(file_path, 'rb') as f:
+        if orjson is not None and os.fstat(f.fileno()).st_size > _MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                with memoryview(mm) as view:
+                    return orjson.loads(view)
+        return _loads(f.read())
+
+try:
+    import ijson
+except ImportError:
+    # 未安装 ijson 时整体解析文件
+    ijson = None  # type: ignore[assignment]
+
+
+def _starts_with_array(f):
+    """
+    判断二进制文件的第一个非空白字符是否为 '['，检查后回到文件开头
+    """
+    result = False
+    while True:
+        chunk = f.read(4096)
+        if not chunk:
+            break
+        stripped = chunk.lstrip(b' \t\r\n')
+        if stripped:
+            result = stripped[:1] == b'['
+            break
+    f.seek(0)
+    return result
+
+
+def _iter_functions(file_path):
+    """
+    逐个产出预制函数文件中的函数
+    
+    安装了 ijson 时按数组元素流式解析，峰值内存只与单个函数相关；
+    否则整体解析后逐个产出。
+    """
+    if ijson is not None:
+        with open(file_path, 'rb') as f:
+            # ijson.items 对非数组的顶层值不产出任何元素，需先确认顶层是数组
+            if not _starts_with_array(f):
+                raise ValueError("文件内容不是预制函数数组")
+            yield from ijson.items(f, 'item', use_float=True)
+        return
+    prefab_functions = _read_json(file_path)
+    if not isinstance(prefab_functions, list):
+        raise ValueError("文件内容不是预制函数数组")
+    yield from prefab_functions
+
+def _resolve_pointer(schema, pointer):
+    """
+    按 JSON Pointer（如 #/definitions/foo）在 Schema 中查找子模式
+    """
+    node = schema
+    for part in pointer.lstrip('#').split('/')[1:]:
+        part = part.replace('~1', '/').replace('~0', '~')
+        node = node[int(part)] if isinstance(node, list) else node[part]
+    return node
+
+
+def _inline_refs(node, root, resolving=()):
+    """
+    将 Schema 中的本地 $ref 替换为其指向的子模式，验证时无需再解析引用
+    
+    Draft 7 中 $ref 会忽略同级关键字，因此直接用目标子模式替换整个节点。
+    外部引用以及递归引用（引用链中再次出现同一指针）保持不变。
+    
+    Args:
+        node: 当前节点
+        root: Schema 根节点
+        resolving: 当前引用链上的指针
+        
+    Returns:
+        展开引用后的节点
+    """
+    if isinstance(node, dict):
+        ref = node.get('$ref')
+        if isinstance(ref, str) and ref.startswith('#'):
+            if ref in resolving:
+                return node
+            return _inline_refs(_resolve_pointer(root, ref), root, resolving + (ref,))
+        return {key: _inline_refs(value, root, resolving) for key, value in node.items()}
+    if isinstance(node, list):
+        return [_inline_refs(item, root, resolving) for item in node]
+    return node
+
+
+@functools.lru_cache(maxsize=8)
+def _load_schema_cached(schema_path):
+    """
+    读取并编译 Schema，同一进程内按绝对路径只加载一次
+    
+    Args:
+        schema_path: Schema 文件的绝对路径
+        
+    Returns:
+        tuple: (Schema 定义, 单个函数的 Draft7Validator)
+    """
+    with open(schema_path, 'rb') as f:
+        schema = _loads(f.read())
+    Draft7Validator.check_schema(schema)
+    
+    # Schema 加载后不再变化，预先展开本地 $ref
+    flattened = _inline_refs(schema, schema)
+    
+    # Schema 顶层为数组，单个函数按其 items 子模式校验
+    if flattened.get('type') == 'array':
+        item_schema = flattened.get('items', {})
+        if '"$ref"' in json.dumps(item_schema):
+            # 仍有未展开的递归引用，需要相对 Schema 根解析；
+            # Draft 7 中 $ref 会忽略同级的 type/items
+            item_schema = dict(flattened, **{'$ref': '#/items'})
+    else:
+        item_schema = flattened
+    return schema, Draft7Validator(item_schema)
 
 # 添加项目根目录到 Python 路径
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -33,18 +199,34 @@ class PrefabFunctionSchemaValidator:
             )
         
         self.schema_path = schema_path
+        # 已编译的验证器由 _load_schema 设置，在所有实例间共享
+        self._validator = None
         self.schema = self._load_schema()
     
+    def __getstate__(self):
+        """
+        序列化时不携带已编译的验证器（无法 pickle），以便传给迁移工作进程
+        """
+        state = self.__dict__.copy()
+        state['_validator'] = None
+        return state
+    
+    def __setstate__(self, state):
+        """
+        反序列化后按 Schema 路径从进程内缓存重新取得已编译的验证器
+        """
+        self.__dict__.update(state)
+        _, self._validator = _load_schema_cached(os.path.abspath(self.schema_path))
+    
     def _load_schema(self):
         """
-        加载 JSON Schema
+        加载 JSON Schema 并取得对应的已编译验证器
         
         Returns:
-            dict: Schema 定义
+            dict: Schema 定义（同一路径的实例共享该对象，不应修改）
         """
         try:
-            with open(self.schema_path, 'r', encoding='utf-8') as f:
-                schema = json.load(f)
+            schema, self._validator = _load_schema_cached(os.path.abspath(self.schema_path))
             print(f"成功加载 Schema: {self.schema_path}")
             return schema
         except Exception as e:
@@ -64,24 +246,29 @@ class PrefabFunctionSchemaValidator:
         print(f"\n验证文件: {file_path}")
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                prefab_functions = json.load(f)
-            
-            # 验证整个文件
-            validate(instance=prefab_functions, schema=self.schema)
+            # 逐个验证函数，开启 DEBUG 时才保留摘要所需的字段
+            verbose = logger.isEnabledFor(logging.DEBUG)
+            summaries = []
+            count = 0
+            for index, func in enumerate(_iter_functions(file_path)):
+                # 只取第一个错误，不必收集全部错误
+                error = next(self._validator.iter_errors(func), None)
+                if error is not None:
+                    print(f"✗ 验证失败: {error.message}")
+                    print(f"  错误位置: {collections.deque([index, *error.path])}")
+                    return False
+                count += 1
+                if verbose:
+                    summaries.append((func['name'], func['function_id'], func['function_type']))
             
             print(f"✓ 验证成功: {file_path}")
-            print(f"  包含 {len(prefab_functions)} 个预制函数")
+            print(f"  包含 {count} 个预制函数")
             
-            # 打印函数摘要
-            for i, func in enumerate(prefab_functions, 1):
-                print(f"  {i}. {func['name']} (ID: {func['function_id']}, Type: {func['function_type']})")
+            # 输出函数摘要
+            for i, (name, function_id, function_type) in enumerate(summaries, 1):
+                logger.debug("  %d. %s (ID: %s, Type: %s)", i, name, function_id, function_type)
             
             return True
-        except ValidationError as e:
-            print(f"✗ 验证失败: {e.message}")
-            print(f"  错误位置: {e.path}")
-            return False
         except Exception as e:
             print(f"✗ 验证失败: {e}")
             return False
@@ -102,13 +289,14 @@ class PrefabFunctionSchemaValidator:
         failure_count = 0
         
         # 查找所有 JSON 文件
-        for filename in os.listdir(directory_path):
-            if filename.endswith('.json') and '_prefab_functions' in filename:
-                file_path = os.path.join(directory_path, filename)
-                if self.validate_file(file_path):
-                    success_count += 1
-                else:
-                    failure_count += 1
+        with os.scandir(directory_path) as entries:
+            for entry in entries:
+                name = entry.name
+                if name.endswith('.json') and '_prefab_functions' in name and entry.is_file():
+                    if self.validate_file(entry.path):
+                        success_count += 1
+                    else:
+                        failure_count += 1
         
         print(f"\n验证完成:")
         print(f"  成功: {success_count} 个文件")
@@ -126,15 +314,11 @@ class PrefabFunctionSchemaValidator:
         Returns:
             bool: 验证是否成功
         """
-        try:
-            # 创建一个包含单个函数的列表，因为 Schema 定义的是数组
-            validate(instance=[function_data], schema=self.schema)
-            return True
-        except ValidationError:
-            return False
+        return self._validator.is_valid(function_data)
 
 def main():
     """主函数"""
+    configure_cli_logging('AUTODSL_VALIDATE_VERBOSE')
     validator = PrefabFunctionSchemaValidator()
     
     # 验证默认目录中的预制函数文件
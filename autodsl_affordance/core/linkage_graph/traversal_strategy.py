@@ -1,13 +1,21 @@
-from typing import List, Dict, Any, Optional, Set
-from enum import Enum
+from typing import List, Dict, Any, Iterable, NamedTuple, Optional, Set, Tuple
+from dataclasses import dataclass
+from enum import IntEnum
 from .edge import LinkageType, GraphEdge
 from .node import GraphNode
 import inspect
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    # 未安装 numba 时使用 NumPy 矩阵乘法计算关键词重叠
+    njit = None
 import importlib
 import os
 import re
 
-class TraversalPhase(Enum):
+class TraversalPhase(IntEnum):
     """遍历阶段枚举"""
     PHASE_1_INTERACTION = 1     # 阶段1：识别交互关系
     PHASE_2_COMBINATION = 2     # 阶段2：识别组合关系
@@ -15,6 +23,240 @@ class TraversalPhase(Enum):
     PHASE_4_DEPENDENCY = 4      # 阶段4：识别依赖关系
     PHASE_5_INVOCATION = 5      # 阶段5：识别调用关系
 
+# 无向链接类型（与 GraphEdge 中按链接类型确定方向的规则一致）
+_UNDIRECTED_LINKAGE_TYPES = frozenset({
+    LinkageType.INTERACTION, LinkageType.COMBINATION, LinkageType.ASSOCIATION
+})
+
+def _edge_key(source_node_id: str, target_node_id: str, linkage_type: LinkageType,
+              undirected: Optional[bool] = None) -> Tuple[str, str, LinkageType, bool]:
+    """与 GraphEdge.__eq__/__hash__ 一致的去重键：无向边不区分端点顺序
+    
+    undirected 为 None 时按链接类型确定方向（与新建 GraphEdge 的默认方向一致）。
+    在构造 GraphEdge 之前用该键判重，重复的边不必再格式化描述和证据字符串。
+    """
+    if undirected is None:
+        undirected = linkage_type in _UNDIRECTED_LINKAGE_TYPES
+    if undirected and target_node_id < source_node_id:
+        return (target_node_id, source_node_id, linkage_type, undirected)
+    return (source_node_id, target_node_id, linkage_type, undirected)
+
+def _edge_keys(edges: Set[GraphEdge]) -> Set[Tuple[str, str, LinkageType, bool]]:
+    """计算一组边的去重键集合"""
+    return {_edge_key(e.source_node_id, e.target_node_id, e.linkage_type, e.is_undirected())
+            for e in edges}
+
+def _unseen_pairs(node_ids: List[str], linkage_type: LinkageType,
+                  seen: Set[Tuple[str, str, LinkageType, bool]]):
+    """按 (i, j>i) 顺序产生 node_ids 中尚未出现过的节点对，并把它们的去重键加入 seen"""
+    for i, source_node_id in enumerate(node_ids):
+        for target_node_id in node_ids[i + 1:]:
+            key = _edge_key(source_node_id, target_node_id, linkage_type)
+            if key not in seen:
+                seen.add(key)
+                yield source_node_id, target_node_id
+
+# 单位类名关键词 -> 建造设施（按顺序匹配，取第一个命中的设施）
+_UNIT_TO_FACILITY = (
+    (('gateway', 'adept', 'zealot', 'stalker', 'sentry', 'high templar'), 'Gateway'),
+    (('stargate', 'phoenix', 'oracle'), 'Stargate'),
+    (('robotics', 'immortal', 'colossus', 'disruptor', 'observer'), 'Robotics Facility'),
+)
+
+# 研究设施节点的小写类名（阶段4 能力依赖的目标）
+_RESEARCH_FACILITIES = frozenset({'twilight council', 'cybernetics core', 'forge'})
+# researched_from 中出现这些关键词时视为已知研究设施
+_RESEARCH_FACILITY_TOKENS = ('twilight', 'forge', 'cybernetics')
+# 能力名中出现这些关键词时视为依赖研究设施
+_RESEARCH_ABILITY_TOKENS = ('charge', 'blink', 'force field')
+
+def _classify_facility(class_name_l: str) -> Optional[str]:
+    """根据小写类名推断建造设施，无法推断时返回 None"""
+    for tokens, facility in _UNIT_TO_FACILITY:
+        for token in tokens:
+            if token in class_name_l:
+                return facility
+    return None
+
+# 类名/描述中的建造设施关键词（区分大小写） -> 建造设施，按优先级排列
+_FACILITY_NAMES = (
+    ('Gateway', 'Gateway'),
+    ('Stargate', 'Stargate'),
+    ('Robotics', 'Robotics Facility'),
+)
+_FACILITY_RE = re.compile('|'.join(re.escape(token) for token, _ in _FACILITY_NAMES))
+_FACILITY_RANK = {token: (rank, facility) for rank, (token, facility) in enumerate(_FACILITY_NAMES)}
+
+def _facility_mentioned(class_name: str, description: str) -> Optional[str]:
+    """从类名或描述中提取建造设施，多个设施同时出现时按 _FACILITY_NAMES 的优先级取第一个"""
+    found = _FACILITY_RE.findall(f"{class_name}\n{description}")
+    if not found:
+        return None
+    return min(_FACILITY_RANK[token] for token in found)[1]
+
+def _keyword_masks(keyword_lists: List[List[str]]) -> np.ndarray:
+    """将每个节点的关键词集合编码为 0/1 矩阵（行：节点，列：关键词）"""
+    vocab: Dict[str, int] = {}
+    for keywords in keyword_lists:
+        for keyword in keywords:
+            vocab.setdefault(keyword, len(vocab))
+    masks = np.zeros((len(keyword_lists), len(vocab)), dtype=np.int32)
+    for row, keywords in enumerate(keyword_lists):
+        for keyword in keywords:
+            masks[row, vocab[keyword]] = 1
+    return masks
+
+# 节点数达到该值时才使用 numba 内核，节点较少时矩阵乘法更快
+_NUMBA_MIN_NODES = 256
+
+if njit is not None:
+    @njit(parallel=True, cache=True)
+    def _pairwise_overlap_kernel(masks):
+        """numba 并行内核：逐行计算两两节点的共同关键词数量，对角线为 0"""
+        n, k = masks.shape
+        out = np.zeros((n, n), dtype=np.int32)
+        for i in prange(n):
+            for j in range(n):
+                if i != j:
+                    count = 0
+                    for c in range(k):
+                        count += masks[i, c] & masks[j, c]
+                    out[i, j] = count
+        return out
+else:
+    _pairwise_overlap_kernel = None
+
+def _pairwise_overlap(masks: np.ndarray) -> np.ndarray:
+    """计算两两节点之间的共同关键词数量，对角线（节点自身）置 0"""
+    if _pairwise_overlap_kernel is not None and masks.shape[0] >= _NUMBA_MIN_NODES:
+        return _pairwise_overlap_kernel(masks)
+    overlap = masks @ masks.T
+    np.fill_diagonal(overlap, 0)
+    return overlap
+
+class _TextIndex(NamedTuple):
+    """节点小写类名/描述的倒排索引"""
+    lowered: Dict[str, Tuple[str, str]]      # 节点ID -> (小写类名, 小写描述)
+    name_index: Dict[str, List[str]]         # 小写类名 -> 节点ID列表
+    desc_index: Dict[str, List[str]]         # 小写描述 -> 节点ID列表
+    position: Dict[str, int]                 # 节点ID -> 在 nodes 中的顺序
+
+def _build_text_index(nodes: Dict[str, GraphNode]) -> _TextIndex:
+    """构建节点小写类名/描述的倒排索引，相同的类名/描述只需比较一次"""
+    lowered = {}
+    name_index = {}
+    desc_index = {}
+    position = {}
+    for i, (node_id, node) in enumerate(nodes.items()):
+        class_name_l = node.class_name.lower()
+        description_l = node.description.lower()
+        lowered[node_id] = (class_name_l, description_l)
+        name_index.setdefault(class_name_l, []).append(node_id)
+        desc_index.setdefault(description_l, []).append(node_id)
+        position[node_id] = i
+    return _TextIndex(lowered, name_index, desc_index, position)
+
+def _nodes_mentioned_in(text_l: str, index: _TextIndex, include_desc: bool = True) -> List[str]:
+    """返回小写类名（或描述）出现在 text_l 中的节点ID，保持 nodes 中的顺序"""
+    matched = set()
+    for name_l, node_ids in index.name_index.items():
+        if name_l in text_l:
+            matched.update(node_ids)
+    if include_desc:
+        for desc_l, node_ids in index.desc_index.items():
+            if desc_l in text_l:
+                matched.update(node_ids)
+    return sorted(matched, key=index.position.__getitem__)
+
+def _nodes_named_with(token_l: str, index: _TextIndex) -> List[str]:
+    """返回小写类名包含 token_l 的节点ID，保持 nodes 中的顺序"""
+    matched = [node_id
+               for name_l, node_ids in index.name_index.items() if token_l in name_l
+               for node_id in node_ids]
+    return sorted(matched, key=index.position.__getitem__)
+
+def _nodes_named_any(names_l: Iterable[str], index: _TextIndex) -> List[str]:
+    """返回小写类名恰好为 names_l 之一的节点ID，保持 nodes 中的顺序"""
+    matched = [node_id for name_l in names_l for node_id in index.name_index.get(name_l, ())]
+    return sorted(set(matched), key=index.position.__getitem__)
+
+def _match_synergy_pairs(nodes: Dict[str, GraphNode],
+                         index: _TextIndex) -> Dict[str, List[Tuple[str, str]]]:
+    """匹配 tactical_context['synergies'] 中提到的其他节点
+    
+    返回 源节点ID -> [(目标节点ID, 协同描述), ...]，顺序与逐节点、逐条协同扫描一致。
+    阶段1~3 使用同一匹配结果，只是生成的链接类型和描述不同。
+    """
+    pairs = {}
+    for node_id, node in nodes.items():
+        if node.tactical_context:
+            matched = [(target_node_id, synergy)
+                       for synergy in node.tactical_context.get('synergies', [])
+                       for target_node_id in _nodes_mentioned_in(synergy.lower(), index)
+                       if target_node_id != node_id]
+            if matched:
+                pairs[node_id] = matched
+    return pairs
+
+class _NodeCapabilities(NamedTuple):
+    """按可选属性对节点分组，各字典为 节点ID -> 属性值，只包含属性存在且非空的节点，保持 nodes 中的顺序"""
+    strong_against: Dict[str, List[str]]
+    weak_against: Dict[str, List[str]]
+    tactical_info: Dict[str, Dict[str, Any]]
+    upgrades: Dict[str, Dict[str, Any]]
+    abilities: Dict[str, Dict[str, Any]]
+    prefab_candidates: Dict[str, List[Dict[str, Any]]]
+
+def _partition_nodes(nodes: Dict[str, GraphNode]) -> _NodeCapabilities:
+    """在阶段入口一次性读取节点的可选属性，内层循环不再逐个节点调用 hasattr/getattr"""
+    partitions = _NodeCapabilities({}, {}, {}, {}, {}, {})
+    attributes = ('strong_against', 'weak_against', 'tactical_info',
+                  'upgrades', 'abilities', 'prefab_function_candidates')
+    for node_id, node in nodes.items():
+        for attribute, partition in zip(attributes, partitions):
+            value = getattr(node, attribute, None)
+            if value:
+                partition[node_id] = value
+    return partitions
+
+@dataclass
+class PhaseContext:
+    """各遍历阶段共用的预处理结果，节点集合不变时在阶段之间复用"""
+    index: _TextIndex                                       # 小写类名/描述及其倒排索引
+    capabilities: _NodeCapabilities                         # 按可选属性分组的节点
+    synergy_pairs: Dict[str, List[Tuple[str, str]]]         # tactical_context 协同匹配结果（阶段1~3）
+    llm_nodes: List[Tuple[str, GraphNode]]                  # 具有 llm_interface 的节点
+    keyword_lists: List[List[str]]                          # llm_nodes 对应的战术关键词
+    keyword_masks: np.ndarray                               # keyword_lists 的 0/1 编码矩阵
+    node_facilities: Dict[str, str]                         # 节点ID -> 根据类名推断的建造设施
+    facility_providers: Dict[str, List[str]]                # 建造设施 -> 类名包含该设施的节点ID
+
+def _build_phase_context(nodes: Dict[str, GraphNode]) -> PhaseContext:
+    """一次性完成各阶段共用的预处理"""
+    index = _build_text_index(nodes)
+    llm_nodes = [(node_id, node) for node_id, node in nodes.items() if node.llm_interface]
+    keyword_lists = [node.llm_interface.get('tactical_keywords', []) for _, node in llm_nodes]
+    node_facilities = {}
+    for node_id in nodes:
+        facility = _classify_facility(index.lowered[node_id][0])
+        if facility:
+            node_facilities[node_id] = facility
+    # 每种用到的建造设施对应的节点只查找一次
+    facility_providers = {
+        facility: _nodes_named_with(facility.lower(), index)
+        for facility in set(node_facilities.values())
+    }
+    return PhaseContext(
+        index=index,
+        capabilities=_partition_nodes(nodes),
+        synergy_pairs=_match_synergy_pairs(nodes, index),
+        llm_nodes=llm_nodes,
+        keyword_lists=keyword_lists,
+        keyword_masks=_keyword_masks(keyword_lists),
+        node_facilities=node_facilities,
+        facility_providers=facility_providers
+    )
+
 class TraversalStrategy:
     """多轮图遍历策略类"""
     
@@ -28,232 +270,264 @@ class TraversalStrategy:
             TraversalPhase.PHASE_5_INVOCATION
         ]
         
-        # 每阶段的链接类型映射
-        self.phase_to_linkage_types = {
-            TraversalPhase.PHASE_1_INTERACTION: [LinkageType.INTERACTION],
-            TraversalPhase.PHASE_2_COMBINATION: [LinkageType.COMBINATION],
-            TraversalPhase.PHASE_3_ASSOCIATION: [LinkageType.ASSOCIATION],
-            TraversalPhase.PHASE_4_DEPENDENCY: [LinkageType.DEPENDENCY],
-            TraversalPhase.PHASE_5_INVOCATION: [LinkageType.INVOCATION]
+        # 每个阶段的下一阶段（最后一个阶段之后为 None）
+        self._next_phase: Dict[TraversalPhase, Optional[TraversalPhase]] = dict(
+            zip(self.traversal_order, self.traversal_order[1:] + [None])
+        )
+        
+        # 阶段共用预处理结果的缓存：((节点ID, 节点对象), ...), PhaseContext)
+        # 仅在一次遍历的各阶段之间复用，执行第一个阶段或 reset() 时清空
+        self._context_cache: Optional[Tuple[tuple, PhaseContext]] = None
+        
+        # 阶段 -> 识别逻辑的分发表
+        self._phase_handlers = {
+            TraversalPhase.PHASE_1_INTERACTION: self.identify_interaction_links,
+            TraversalPhase.PHASE_2_COMBINATION: self.identify_combination_links,
+            TraversalPhase.PHASE_3_ASSOCIATION: self.identify_association_links,
+            TraversalPhase.PHASE_4_DEPENDENCY: self.identify_dependency_links,
+            TraversalPhase.PHASE_5_INVOCATION: self.identify_invocation_links,
         }
+        
+        # 每阶段的链接类型映射，按阶段编号直接索引（下标 0 不对应任何阶段）
+        self.phase_to_linkage_types: List[List[LinkageType]] = [
+            [],
+            [LinkageType.INTERACTION],  # PHASE_1_INTERACTION
+            [LinkageType.COMBINATION],  # PHASE_2_COMBINATION
+            [LinkageType.ASSOCIATION],  # PHASE_3_ASSOCIATION
+            [LinkageType.DEPENDENCY],   # PHASE_4_DEPENDENCY
+            [LinkageType.INVOCATION]    # PHASE_5_INVOCATION
+        ]
     
     def get_next_phase(self, current_phase: Optional[TraversalPhase]) -> Optional[TraversalPhase]:
         """获取下一个遍历阶段"""
         if current_phase is None:
             return self.traversal_order[0]
-        
-        current_index = self.traversal_order.index(current_phase)
-        if current_index < len(self.traversal_order) - 1:
-            return self.traversal_order[current_index + 1]
-        return None
+        return self._next_phase.get(current_phase)
     
     def get_linkage_types_for_phase(self, phase: TraversalPhase) -> List[LinkageType]:
         """获取指定阶段的链接类型"""
-        return self.phase_to_linkage_types.get(phase, [])
+        if isinstance(phase, TraversalPhase):
+            return self.phase_to_linkage_types[phase]
+        return []
     
     def identify_interaction_links(self, nodes: Dict[str, GraphNode], 
-                                  existing_edges: Set[GraphEdge]) -> List[GraphEdge]:
+                                  existing_edges: Set[GraphEdge],
+                                  ctx: Optional[PhaseContext] = None) -> List[GraphEdge]:
         """阶段1：识别交互关系
         
         交互关系定义为：两个单位类之间存在逻辑上的交互，通常基于游戏内的克制关系、协同效应等
         """
         new_edges = []
         
+        # 各阶段共用的预处理结果，通常由 execute_phase 预先构建并传入
+        if ctx is None:
+            ctx = _build_phase_context(nodes)
+        index = ctx.index
+        synergy_pairs = ctx.synergy_pairs
+        capabilities = ctx.capabilities
+        # 已有边及本阶段已发现边的去重键
+        seen = _edge_keys(existing_edges)
+        
         for node_id, node in nodes.items():
             # 1. 基于克制关系的交互（从strong_against和weak_against属性直接提取）
-            if hasattr(node, 'strong_against'):
-                for strong_target in node.strong_against:
-                    for target_node_id, target_node in nodes.items():
-                        if node_id != target_node_id and \
-                           strong_target.lower() in target_node.class_name.lower():
-                            
-                            edge = GraphEdge(
-                                source_node_id=node_id,
-                                target_node_id=target_node_id,
-                                linkage_type=LinkageType.INTERACTION,
-                                description=f"{node.class_name} 强势对抗 {target_node.class_name}",
-                                confidence=0.85,
-                                evidence=[f"克制关系数据显示 {node.class_name} 强势对抗 {strong_target}"]
-                            )
+            if node_id in capabilities.strong_against:
+                for strong_target in capabilities.strong_against[node_id]:
+                    strong_target_l = strong_target.lower()
+                    for target_node_id in _nodes_named_with(strong_target_l, index):
+                        target_node = nodes[target_node_id]
+                        if node_id != target_node_id:
                             
-                            if edge not in existing_edges:
-                                new_edges.append(edge)
+                            key = _edge_key(node_id, target_node_id, LinkageType.INTERACTION)
+                            if key not in seen:
+                                seen.add(key)
+                                new_edges.append(GraphEdge(
+                                    source_node_id=node_id,
+                                    target_node_id=target_node_id,
+                                    linkage_type=LinkageType.INTERACTION,
+                                    description=f"{node.class_name} 强势对抗 {target_node.class_name}",
+                                    confidence=0.85,
+                                    evidence=[f"克制关系数据显示 {node.class_name} 强势对抗 {strong_target}"]
+                                ))
             
-            if hasattr(node, 'weak_against'):
-                for weak_target in node.weak_against:
-                    for target_node_id, target_node in nodes.items():
-                        if node_id != target_node_id and \
-                           weak_target.lower() in target_node.class_name.lower():
-                            
-                            edge = GraphEdge(
-                                source_node_id=node_id,
-                                target_node_id=target_node_id,
-                                linkage_type=LinkageType.INTERACTION,
-                                description=f"{node.class_name} 弱势对抗 {target_node.class_name}",
-                                confidence=0.85,
-                                evidence=[f"克制关系数据显示 {node.class_name} 弱势对抗 {weak_target}"]
-                            )
+            if node_id in capabilities.weak_against:
+                for weak_target in capabilities.weak_against[node_id]:
+                    weak_target_l = weak_target.lower()
+                    for target_node_id in _nodes_named_with(weak_target_l, index):
+                        target_node = nodes[target_node_id]
+                        if node_id != target_node_id:
                             
-                            if edge not in existing_edges:
-                                new_edges.append(edge)
+                            key = _edge_key(node_id, target_node_id, LinkageType.INTERACTION)
+                            if key not in seen:
+                                seen.add(key)
+                                new_edges.append(GraphEdge(
+                                    source_node_id=node_id,
+                                    target_node_id=target_node_id,
+                                    linkage_type=LinkageType.INTERACTION,
+                                    description=f"{node.class_name} 弱势对抗 {target_node.class_name}",
+                                    confidence=0.85,
+                                    evidence=[f"克制关系数据显示 {node.class_name} 弱势对抗 {weak_target}"]
+                                ))
             
-            # 2. 基于战术上下文的交互
-            if node.tactical_context:
-                # 从tactical_context中提取协同单位
-                synergies = node.tactical_context.get('synergies', [])
-                for synergy in synergies:
-                    for target_node_id, target_node in nodes.items():
-                        if node_id != target_node_id and \
-                           (target_node.class_name.lower() in synergy.lower() or \
-                            target_node.description.lower() in synergy.lower()):
-                            
-                            edge = GraphEdge(
-                                source_node_id=node_id,
-                                target_node_id=target_node_id,
-                                linkage_type=LinkageType.INTERACTION,
-                                description=f"{node.class_name} 与 {target_node.class_name} 具有战术协同",
-                                confidence=0.8,
-                                evidence=[f"战术上下文显示协同: {synergy}"]
-                            )
-                            
-                            if edge not in existing_edges:
-                                new_edges.append(edge)
+            # 2. 基于战术上下文的交互（tactical_context中的协同单位，已预先匹配）
+            for target_node_id, synergy in synergy_pairs.get(node_id, ()):
+                key = _edge_key(node_id, target_node_id, LinkageType.INTERACTION)
+                if key not in seen:
+                    seen.add(key)
+                    target_node = nodes[target_node_id]
+                    new_edges.append(GraphEdge(
+                        source_node_id=node_id,
+                        target_node_id=target_node_id,
+                        linkage_type=LinkageType.INTERACTION,
+                        description=f"{node.class_name} 与 {target_node.class_name} 具有战术协同",
+                        confidence=0.8,
+                        evidence=[f"战术上下文显示协同: {synergy}"]
+                    ))
             
             # 3. 基于LLM接口中的共同战术
             if node.llm_interface:
                 common_tactics = node.llm_interface.get('common_tactics', [])
                 for tactic in common_tactics:
-                    for target_node_id, target_node in nodes.items():
-                        if node_id != target_node_id and \
-                           (target_node.class_name.lower() in tactic.lower() or \
-                            target_node.description.lower() in tactic.lower()):
+                    tactic_l = tactic.lower()
+                    for target_node_id in _nodes_mentioned_in(tactic_l, index):
+                        target_node = nodes[target_node_id]
+                        if node_id != target_node_id:
                             
-                            edge = GraphEdge(
-                                source_node_id=node_id,
-                                target_node_id=target_node_id,
-                                linkage_type=LinkageType.INTERACTION,
-                                description=f"{node.class_name} 与 {target_node.class_name} 在战术 '{tactic}' 中协同使用",
-                                confidence=0.75,
-                                evidence=[f"LLM接口共同战术: {tactic}"]
-                            )
-                            
-                            if edge not in existing_edges:
-                                new_edges.append(edge)
+                            key = _edge_key(node_id, target_node_id, LinkageType.INTERACTION)
+                            if key not in seen:
+                                seen.add(key)
+                                new_edges.append(GraphEdge(
+                                    source_node_id=node_id,
+                                    target_node_id=target_node_id,
+                                    linkage_type=LinkageType.INTERACTION,
+                                    description=f"{node.class_name} 与 {target_node.class_name} 在战术 '{tactic}' 中协同使用",
+                                    confidence=0.75,
+                                    evidence=[f"LLM接口共同战术: {tactic}"]
+                                ))
         
         return new_edges
     
     def identify_combination_links(self, nodes: Dict[str, GraphNode], 
                                    existing_edges: Set[GraphEdge],
-                                   interaction_edges: List[GraphEdge]) -> List[GraphEdge]:
+                                   ctx: Optional[PhaseContext] = None) -> List[GraphEdge]:
         """阶段2：识别组合关系
         
         组合关系定义为：两个或多个单位类在战术上经常组合使用，形成协同效应
         """
         new_edges = []
         
-        # 1. 基于战术上下文的阵型偏好和协同关系
-        for node_id, node in nodes.items():
-            if node.tactical_context:
-                # 从tactical_context中提取协同单位
-                synergies = node.tactical_context.get('synergies', [])
-                for synergy in synergies:
-                    for target_node_id, target_node in nodes.items():
-                        if node_id != target_node_id and \
-                           (target_node.class_name.lower() in synergy.lower() or \
-                            target_node.description.lower() in synergy.lower()):
-                            
-                            edge = GraphEdge(
-                                source_node_id=node_id,
-                                target_node_id=target_node_id,
-                                linkage_type=LinkageType.COMBINATION,
-                                description=f"{node.class_name} 与 {target_node.class_name} 形成战术组合",
-                                confidence=0.85,
-                                evidence=[f"战术协同: {synergy}"]
-                            )
-                            
-                            if edge not in existing_edges:
-                                new_edges.append(edge)
+        # 各阶段共用的预处理结果，通常由 execute_phase 预先构建并传入
+        if ctx is None:
+            ctx = _build_phase_context(nodes)
+        index = ctx.index
+        synergy_pairs = ctx.synergy_pairs
+        capabilities = ctx.capabilities
+        # 已有边及本阶段已发现边的去重键
+        seen = _edge_keys(existing_edges)
+        
+        # 1. 基于战术上下文的阵型偏好和协同关系（tactical_context中的协同单位，已预先匹配）
+        for node_id, matched in synergy_pairs.items():
+            node = nodes[node_id]
+            for target_node_id, synergy in matched:
+                key = _edge_key(node_id, target_node_id, LinkageType.COMBINATION)
+                if key not in seen:
+                    seen.add(key)
+                    target_node = nodes[target_node_id]
+                    new_edges.append(GraphEdge(
+                        source_node_id=node_id,
+                        target_node_id=target_node_id,
+                        linkage_type=LinkageType.COMBINATION,
+                        description=f"{node.class_name} 与 {target_node.class_name} 形成战术组合",
+                        confidence=0.85,
+                        evidence=[f"战术协同: {synergy}"]
+                    ))
         
         # 2. 基于预置函数候选中的组合使用模式
-        for node_id, node in nodes.items():
-            prefab_candidates = getattr(node, 'prefab_function_candidates', [])
+        for node_id, prefab_candidates in capabilities.prefab_candidates.items():
+            node = nodes[node_id]
             for candidate in prefab_candidates:
                 # 检查执行流程中是否涉及其他单位
                 execution_flow = candidate.get('execution_flow', [])
                 for step in execution_flow:
-                    for target_node_id, target_node in nodes.items():
-                        if node_id != target_node_id and \
-                           (target_node.class_name.lower() in step.lower() or \
-                            target_node.description.lower() in step.lower()):
-                            
-                            edge = GraphEdge(
-                                source_node_id=node_id,
-                                target_node_id=target_node_id,
-                                linkage_type=LinkageType.COMBINATION,
-                                description=f"{node.class_name} 与 {target_node.class_name} 在战术 '{candidate.get('function_name', '')}' 中组合使用",
-                                confidence=0.9,
-                                evidence=[f"预置函数执行流程: {step}"]
-                            )
+                    step_l = step.lower()
+                    for target_node_id in _nodes_mentioned_in(step_l, index):
+                        target_node = nodes[target_node_id]
+                        if node_id != target_node_id:
                             
-                            if edge not in existing_edges:
-                                new_edges.append(edge)
+                            key = _edge_key(node_id, target_node_id, LinkageType.COMBINATION)
+                            if key not in seen:
+                                seen.add(key)
+                                new_edges.append(GraphEdge(
+                                    source_node_id=node_id,
+                                    target_node_id=target_node_id,
+                                    linkage_type=LinkageType.COMBINATION,
+                                    description=f"{node.class_name} 与 {target_node.class_name} 在战术 '{candidate.get('function_name', '')}' 中组合使用",
+                                    confidence=0.9,
+                                    evidence=[f"预置函数执行流程: {step}"]
+                                ))
         
         # 3. 基于战术角色互补的组合
-        for node_id, node in nodes.items():
-            if node.llm_interface:
-                primary_roles = node.llm_interface.get('primary_role', [])
-                
-                for target_node_id, target_node in nodes.items():
-                    if node_id != target_node_id and target_node.llm_interface:
-                        target_roles = target_node.llm_interface.get('primary_role', [])
-                        
-                        # 检查角色互补性（前线+后排，肉盾+输出等）
-                        if ('前线' in primary_roles or '肉盾' in primary_roles) and \
-                           ('后排' in target_roles or '输出' in target_roles):
-                            
-                            edge = GraphEdge(
-                                source_node_id=node_id,
-                                target_node_id=target_node_id,
-                                linkage_type=LinkageType.COMBINATION,
-                                description=f"{node.class_name} (前线/肉盾) 与 {target_node.class_name} (后排/输出) 形成互补组合",
-                                confidence=0.85,
-                                evidence=[f"角色互补: {primary_roles[0]} + {target_roles[0]}"]
-                            )
-                            
-                            if edge not in existing_edges:
-                                new_edges.append(edge)
+        # 先按角色把节点分为前线/肉盾与后排/输出两组，只在两组之间配对
+        llm_nodes = ctx.llm_nodes
+        front_nodes = []
+        back_nodes = []
+        for node_id, node in llm_nodes:
+            roles = node.llm_interface.get('primary_role', [])
+            if '前线' in roles or '肉盾' in roles:
+                front_nodes.append((node_id, node, roles))
+            if '后排' in roles or '输出' in roles:
+                back_nodes.append((node_id, node, roles))
+        
+        for node_id, node, primary_roles in front_nodes:
+            for target_node_id, target_node, target_roles in back_nodes:
+                # 检查角色互补性（前线+后排，肉盾+输出等）
+                if node_id != target_node_id:
+                    
+                    key = _edge_key(node_id, target_node_id, LinkageType.COMBINATION)
+                    if key not in seen:
+                        seen.add(key)
+                        new_edges.append(GraphEdge(
+                            source_node_id=node_id,
+                            target_node_id=target_node_id,
+                            linkage_type=LinkageType.COMBINATION,
+                            description=f"{node.class_name} (前线/肉盾) 与 {target_node.class_name} (后排/输出) 形成互补组合",
+                            confidence=0.85,
+                            evidence=[f"角色互补: {primary_roles[0]} + {target_roles[0]}"]
+                        ))
         
         # 4. 基于相同战术关键词的组合
-        for node_id, node in nodes.items():
-            if node.llm_interface:
-                tactical_keywords = node.llm_interface.get('tactical_keywords', [])
-                
-                for target_node_id, target_node in nodes.items():
-                    if node_id != target_node_id and target_node.llm_interface:
-                        target_keywords = target_node.llm_interface.get('tactical_keywords', [])
-                        
-                        # 计算共同关键词数量
-                        common_keywords = set(tactical_keywords) & set(target_keywords)
-                        if len(common_keywords) >= 2:
-                            
-                            edge = GraphEdge(
-                                source_node_id=node_id,
-                                target_node_id=target_node_id,
-                                linkage_type=LinkageType.COMBINATION,
-                                description=f"{node.class_name} 与 {target_node.class_name} 具有共同战术关键词",
-                                confidence=0.75,
-                                evidence=[f"共同战术关键词: {', '.join(common_keywords)}"]
-                            )
-                            
-                            if edge not in existing_edges:
-                                new_edges.append(edge)
+        # 关键词集合编码为 0/1 矩阵，一次矩阵乘法得到两两之间的共同关键词数量
+        keyword_lists = ctx.keyword_lists
+        # 至少两个节点各有两个以上关键词时才可能出现共同关键词对，否则跳过矩阵计算
+        if sum(len(keywords) >= 2 for keywords in keyword_lists) >= 2:
+            overlap = _pairwise_overlap(ctx.keyword_masks)
+            # 组合关系是无向的，(col, row) 总在 (row, col) 之后出现且去重键相同，
+            # 直接在矩阵上只取上三角，避免逐对生成并比较重复的去重键
+            rows, cols = np.nonzero(np.triu(overlap >= 2, k=1))
+        else:
+            rows = cols = np.empty(0, dtype=np.intp)
+        for row, col in zip(rows.tolist(), cols.tolist()):
+            node_id, node = llm_nodes[row]
+            target_node_id, target_node = llm_nodes[col]
+            
+            key = _edge_key(node_id, target_node_id, LinkageType.COMBINATION)
+            if key not in seen:
+                seen.add(key)
+                # 计算共同关键词
+                common_keywords = set(keyword_lists[row]) & set(keyword_lists[col])
+                new_edges.append(GraphEdge(
+                    source_node_id=node_id,
+                    target_node_id=target_node_id,
+                    linkage_type=LinkageType.COMBINATION,
+                    description=f"{node.class_name} 与 {target_node.class_name} 具有共同战术关键词",
+                    confidence=0.75,
+                    evidence=[f"共同战术关键词: {', '.join(common_keywords)}"]
+                ))
         
         return new_edges
     
     def identify_association_links(self, nodes: Dict[str, GraphNode],
                                    existing_edges: Set[GraphEdge],
-                                   interaction_edges: List[GraphEdge],
-                                   combination_edges: List[GraphEdge]) -> List[GraphEdge]:
+                                   ctx: Optional[PhaseContext] = None) -> List[GraphEdge]:
         """阶段3：识别关联关系
         
         关联关系定义为：两个单位类之间存在某种松散的关联，但不如组合关系紧密
@@ -261,61 +535,54 @@ class TraversalStrategy:
         """
         new_edges = []
         
-        # 1. 基于战术协同关系的关联（从tactical_context中提取）
-        for node_id, node in nodes.items():
-            if node.tactical_context:
-                synergies = node.tactical_context.get('synergies', [])
-                for synergy in synergies:
-                    # 查找提到的其他单位
-                    for target_node_id, target_node in nodes.items():
-                        if node_id != target_node_id and \
-                           (target_node.class_name.lower() in synergy.lower() or \
-                            target_node.description.lower() in synergy.lower()):
-                            
-                            edge = GraphEdge(
-                                source_node_id=node_id,
-                                target_node_id=target_node_id,
-                                linkage_type=LinkageType.ASSOCIATION,
-                                description=f"{node.class_name} 与 {target_node.class_name} 具有战术协同关系",
-                                confidence=0.8,
-                                evidence=[f"战术协同: {synergy}"]
-                            )
-                            
-                            if edge not in existing_edges:
-                                new_edges.append(edge)
+        # 各阶段共用的预处理结果，通常由 execute_phase 预先构建并传入
+        if ctx is None:
+            ctx = _build_phase_context(nodes)
+        index = ctx.index
+        synergy_pairs = ctx.synergy_pairs
+        # 已有边及本阶段已发现边的去重键
+        seen = _edge_keys(existing_edges)
+        
+        # 1. 基于战术协同关系的关联（从tactical_context中提取，已预先匹配）
+        for node_id, matched in synergy_pairs.items():
+            node = nodes[node_id]
+            for target_node_id, synergy in matched:
+                key = _edge_key(node_id, target_node_id, LinkageType.ASSOCIATION)
+                if key not in seen:
+                    seen.add(key)
+                    target_node = nodes[target_node_id]
+                    new_edges.append(GraphEdge(
+                        source_node_id=node_id,
+                        target_node_id=target_node_id,
+                        linkage_type=LinkageType.ASSOCIATION,
+                        description=f"{node.class_name} 与 {target_node.class_name} 具有战术协同关系",
+                        confidence=0.8,
+                        evidence=[f"战术协同: {synergy}"]
+                    ))
         
         # 2. 基于相同建造设施的关联
         facility_groups = {}
         for node_id, node in nodes.items():
-            # 从类名或描述中提取建造设施信息
-            if 'Gateway' in node.class_name or 'Gateway' in node.description:
-                facility = 'Gateway'
-            elif 'Stargate' in node.class_name or 'Stargate' in node.description:
-                facility = 'Stargate'
-            elif 'Robotics' in node.class_name or 'Robotics' in node.description:
-                facility = 'Robotics Facility'
-            else:
-                continue
-            
-            if facility not in facility_groups:
-                facility_groups[facility] = []
-            facility_groups[facility].append(node_id)
+            # 从类名或描述中提取建造设施信息（一次正则扫描）
+            facility = _facility_mentioned(node.class_name, node.description)
+            if facility:
+                facility_groups.setdefault(facility, []).append(node_id)
         
-        # 为相同建造设施的单位创建关联关系
+        # 为相同建造设施的单位创建关联关系（同组的描述/证据文本相同，只格式化一次）
         for facility, node_ids in facility_groups.items():
-            for i in range(len(node_ids)):
-                for j in range(i + 1, len(node_ids)):
-                    edge = GraphEdge(
-                        source_node_id=node_ids[i],
-                        target_node_id=node_ids[j],
-                        linkage_type=LinkageType.ASSOCIATION,
-                        description=f"同由{facility}建造的单位",
-                        confidence=0.85,
-                        evidence=[f"相同建造设施: {facility}"]
-                    )
-                    
-                    if edge not in existing_edges:
-                        new_edges.append(edge)
+            description = f"同由{facility}建造的单位"
+            evidence = f"相同建造设施: {facility}"
+            new_edges.extend(
+                GraphEdge(
+                    source_node_id=source_node_id,
+                    target_node_id=target_node_id,
+                    linkage_type=LinkageType.ASSOCIATION,
+                    description=description,
+                    confidence=0.85,
+                    evidence=[evidence]
+                )
+                for source_node_id, target_node_id in _unseen_pairs(node_ids, LinkageType.ASSOCIATION, seen)
+            )
         
         # 3. 基于战术角色的关联（只保留核心关联）
         role_groups = {}
@@ -329,253 +596,268 @@ class TraversalStrategy:
         
         # 为相同战术角色的单位创建关联关系（限制数量）
         for role, node_ids in role_groups.items():
+            description = f"具有相同战术角色 '{role}' 的单位"
+            evidence = f"相同战术角色: {role}"
             # 只保留前5个单位的关联，避免数量膨胀
-            for i in range(min(5, len(node_ids))):
-                for j in range(i + 1, min(5, len(node_ids))):
-                    edge = GraphEdge(
-                        source_node_id=node_ids[i],
-                        target_node_id=node_ids[j],
-                        linkage_type=LinkageType.ASSOCIATION,
-                        description=f"具有相同战术角色 '{role}' 的单位",
-                        confidence=0.75,
-                        evidence=[f"相同战术角色: {role}"]
-                    )
-                    
-                    if edge not in existing_edges:
-                        new_edges.append(edge)
+            new_edges.extend(
+                GraphEdge(
+                    source_node_id=source_node_id,
+                    target_node_id=target_node_id,
+                    linkage_type=LinkageType.ASSOCIATION,
+                    description=description,
+                    confidence=0.75,
+                    evidence=[evidence]
+                )
+                for source_node_id, target_node_id in _unseen_pairs(node_ids[:5], LinkageType.ASSOCIATION, seen)
+            )
         
         return new_edges
     
     def identify_dependency_links(self, nodes: Dict[str, GraphNode],
                                  existing_edges: Set[GraphEdge],
-                                 interaction_edges: List[GraphEdge],
-                                 combination_edges: List[GraphEdge],
-                                 association_edges: List[GraphEdge]) -> List[GraphEdge]:
+                                 ctx: Optional[PhaseContext] = None) -> List[GraphEdge]:
         """阶段4：识别依赖关系
         
         依赖关系定义为：一个单位类依赖于另一个单位类才能发挥最大效用
         """
         new_edges = []
         
+        # 各阶段共用的预处理结果，通常由 execute_phase 预先构建并传入
+        if ctx is None:
+            ctx = _build_phase_context(nodes)
+        index = ctx.index
+        capabilities = ctx.capabilities
+        # 已有边及本阶段已发现边的去重键
+        seen = _edge_keys(existing_edges)
+        
         # 1. 基于战术协同的依赖关系（从tactical_info中提取）
-        for node_id, node in nodes.items():
-            if hasattr(node, 'tactical_info') and node.tactical_info:
-                synergies = node.tactical_info.get('synergies', [])
-                for synergy_unit in synergies:
-                    for target_node_id, target_node in nodes.items():
-                        if node_id != target_node_id and \
-                           synergy_unit.lower() in target_node.class_name.lower():
-                            
-                            edge = GraphEdge(
+        for node_id, tactical_info in capabilities.tactical_info.items():
+            node = nodes[node_id]
+            synergies = tactical_info.get('synergies', [])
+            for synergy_unit in synergies:
+                synergy_unit_l = synergy_unit.lower()
+                for target_node_id in _nodes_named_with(synergy_unit_l, index):
+                    target_node = nodes[target_node_id]
+                    if node_id != target_node_id:
+                        
+                        key = _edge_key(node_id, target_node_id, LinkageType.DEPENDENCY)
+                        if key not in seen:
+                            seen.add(key)
+                            new_edges.append(GraphEdge(
                                 source_node_id=node_id,
                                 target_node_id=target_node_id,
                                 linkage_type=LinkageType.DEPENDENCY,
                                 description=f"{node.class_name} 在战术上依赖于 {target_node.class_name} 形成协同",
                                 confidence=0.85,
                                 evidence=[f"战术协同: {synergy_unit}"]
-                            )
-                            
-                            if edge not in existing_edges:
-                                new_edges.append(edge)
+                            ))
         
         # 2. 基于建造设施的依赖关系
-        for node_id, node in nodes.items():
-            # 根据单位类型推断建造设施
-            unit_type = node.unit_type.lower()
-            class_name = node.class_name.lower()
-            
-            # 推断建造设施
-            facility = None
-            if 'gateway' in class_name or 'adept' in class_name or 'zealot' in class_name or 'stalker' in class_name or 'sentry' in class_name or 'high templar' in class_name:
-                facility = 'Gateway'
-            elif 'stargate' in class_name or 'phoenix' in class_name or 'oracle' in class_name:
-                facility = 'Stargate'
-            elif 'robotics' in class_name or 'immortal' in class_name or 'colossus' in class_name or 'disruptor' in class_name or 'observer' in class_name:
-                facility = 'Robotics Facility'
-            
-            if facility:
-                # 查找建造设施对应的节点
-                for target_node_id, target_node in nodes.items():
-                    if node_id != target_node_id and \
-                       facility.lower() in target_node.class_name.lower():
-                        
-                        edge = GraphEdge(
-                            source_node_id=node_id,
-                            target_node_id=target_node_id,
-                            linkage_type=LinkageType.DEPENDENCY,
-                            description=f"{node.class_name} 依赖于 {target_node.class_name} 建造",
-                            confidence=0.95,
-                            evidence=[f"建造设施: {facility}"]
-                        )
+        # 根据类名推断的建造设施及其对应节点已在 PhaseContext 中预先计算，没有节点能推断出设施时整段跳过
+        facility_providers = ctx.facility_providers
+        for node_id, facility in ctx.node_facilities.items():
+            node = nodes[node_id]
+            if facility_providers[facility]:
+                # 建造设施对应的节点
+                for target_node_id in facility_providers[facility]:
+                    target_node = nodes[target_node_id]
+                    if node_id != target_node_id:
                         
-                        if edge not in existing_edges:
-                            new_edges.append(edge)
+                        key = _edge_key(node_id, target_node_id, LinkageType.DEPENDENCY)
+                        if key not in seen:
+                            seen.add(key)
+                            new_edges.append(GraphEdge(
+                                source_node_id=node_id,
+                                target_node_id=target_node_id,
+                                linkage_type=LinkageType.DEPENDENCY,
+                                description=f"{node.class_name} 依赖于 {target_node.class_name} 建造",
+                                confidence=0.95,
+                                evidence=[f"建造设施: {facility}"]
+                            ))
         
         # 3. 基于升级需求的依赖关系
-        for node_id, node in nodes.items():
-            if hasattr(node, 'upgrades') and node.upgrades:
-                for upgrade_name, upgrade_data in node.upgrades.items():
-                    researched_from = upgrade_data.get('researched_from', '')
-                    if researched_from:
-                        # 查找研究设施对应的节点
-                        for target_node_id, target_node in nodes.items():
-                            if node_id != target_node_id and \
-                               (target_node.class_name.lower() in researched_from.lower() or \
-                                'twilight' in researched_from.lower() or \
-                                'forge' in researched_from.lower() or \
-                                'cybernetics' in researched_from.lower()):
-                                
-                                edge = GraphEdge(
+        for node_id, upgrades in capabilities.upgrades.items():
+            node = nodes[node_id]
+            for upgrade_name, upgrade_data in upgrades.items():
+                researched_from = upgrade_data.get('researched_from', '')
+                if researched_from:
+                    researched_from_l = researched_from.lower()
+                    is_research_facility = any(token in researched_from_l
+                                               for token in _RESEARCH_FACILITY_TOKENS)
+                    # 查找研究设施对应的节点（研究设施为已知设施时匹配所有节点）
+                    if is_research_facility:
+                        target_ids = list(nodes)
+                    else:
+                        target_ids = _nodes_mentioned_in(researched_from_l, index, include_desc=False)
+                    for target_node_id in target_ids:
+                        target_node = nodes[target_node_id]
+                        if node_id != target_node_id:
+                            
+                            key = _edge_key(node_id, target_node_id, LinkageType.DEPENDENCY)
+                            if key not in seen:
+                                seen.add(key)
+                                new_edges.append(GraphEdge(
                                     source_node_id=node_id,
                                     target_node_id=target_node_id,
                                     linkage_type=LinkageType.DEPENDENCY,
                                     description=f"{node.class_name} 的 {upgrade_name} 升级依赖于研究设施",
                                     confidence=0.9,
                                     evidence=[f"升级需求: {researched_from}"]
-                                )
-                                
-                                if edge not in existing_edges:
-                                    new_edges.append(edge)
+                                ))
         
         # 4. 基于能力协同的依赖关系
-        for node_id, node in nodes.items():
-            if hasattr(node, 'abilities') and node.abilities:
-                for ability_name, ability_data in node.abilities.items():
+        # 研究设施对应的节点只查找一次，图中没有研究设施节点时整段跳过
+        research_node_ids = _nodes_named_any(_RESEARCH_FACILITIES, index)
+        if research_node_ids:
+            for node_id, abilities in capabilities.abilities.items():
+                node = nodes[node_id]
+                for ability_name, ability_data in abilities.items():
                     # 检查能力是否需要其他单位支持
-                    if 'charge' in ability_name.lower() or 'blink' in ability_name.lower() or 'force field' in ability_name.lower():
+                    ability_name_l = ability_name.lower()
+                    if any(token in ability_name_l for token in _RESEARCH_ABILITY_TOKENS):
                         # 这些能力通常需要特定的升级或支持
-                        for target_node_id, target_node in nodes.items():
-                            if node_id != target_node_id and \
-                               (target_node.class_name.lower() in ['twilight council', 'cybernetics core', 'forge']):
+                        for target_node_id in research_node_ids:
+                            target_node = nodes[target_node_id]
+                            if node_id != target_node_id:
                                 
-                                edge = GraphEdge(
-                                    source_node_id=node_id,
-                                    target_node_id=target_node_id,
-                                    linkage_type=LinkageType.DEPENDENCY,
-                                    description=f"{node.class_name} 的 {ability_name} 能力依赖于研究设施",
-                                    confidence=0.85,
-                                    evidence=[f"能力需求: {ability_name}"]
-                                )
-                                
-                                if edge not in existing_edges:
-                                    new_edges.append(edge)
+                                key = _edge_key(node_id, target_node_id, LinkageType.DEPENDENCY)
+                                if key not in seen:
+                                    seen.add(key)
+                                    new_edges.append(GraphEdge(
+                                        source_node_id=node_id,
+                                        target_node_id=target_node_id,
+                                        linkage_type=LinkageType.DEPENDENCY,
+                                        description=f"{node.class_name} 的 {ability_name} 能力依赖于研究设施",
+                                        confidence=0.85,
+                                        evidence=[f"能力需求: {ability_name}"]
+                                    ))
         
         return new_edges
     
     def identify_invocation_links(self, nodes: Dict[str, GraphNode],
                                  existing_edges: Set[GraphEdge],
-                                 interaction_edges: List[GraphEdge],
-                                 combination_edges: List[GraphEdge],
-                                 association_edges: List[GraphEdge],
-                                 dependency_edges: List[GraphEdge]) -> List[GraphEdge]:
+                                 ctx: Optional[PhaseContext] = None) -> List[GraphEdge]:
         """阶段5：识别调用关系
         
         调用关系定义为：一个单位类的方法明确调用了另一个单位类的方法
         """
         new_edges = []
         
+        # 各阶段共用的预处理结果，通常由 execute_phase 预先构建并传入
+        if ctx is None:
+            ctx = _build_phase_context(nodes)
+        index = ctx.index
+        capabilities = ctx.capabilities
+        # 已有边及本阶段已发现边的去重键
+        seen = _edge_keys(existing_edges)
+        
         # 1. 基于方法参数类型的调用关系
         for node_id, node in nodes.items():
             for method in node.methods:
                 for param in method.parameters:
                     param_type = param.get('type', '')
+                    param_type_l = param_type.lower()
                     
                     # 查找对应的目标节点
-                    for target_node_id, target_node in nodes.items():
-                        if node_id != target_node_id and \
-                           param_type.lower() in target_node.class_name.lower():
+                    for target_node_id in _nodes_named_with(param_type_l, index):
+                        target_node = nodes[target_node_id]
+                        if node_id != target_node_id:
                             
-                            edge = GraphEdge(
-                                source_node_id=node_id,
-                                target_node_id=target_node_id,
-                                linkage_type=LinkageType.INVOCATION,
-                                source_method=method.name,
-                                description=f"{node.class_name}.{method.name} 方法通过参数引用了 {target_node.class_name}",
-                                confidence=0.85,
-                                evidence=[f"方法参数类型: {param_type}"]
-                            )
-                            
-                            if edge not in existing_edges:
-                                new_edges.append(edge)
+                            key = _edge_key(node_id, target_node_id, LinkageType.INVOCATION)
+                            if key not in seen:
+                                seen.add(key)
+                                new_edges.append(GraphEdge(
+                                    source_node_id=node_id,
+                                    target_node_id=target_node_id,
+                                    linkage_type=LinkageType.INVOCATION,
+                                    source_method=method.name,
+                                    description=f"{node.class_name}.{method.name} 方法通过参数引用了 {target_node.class_name}",
+                                    confidence=0.85,
+                                    evidence=[f"方法参数类型: {param_type}"]
+                                ))
         
         # 2. 基于方法返回类型的调用关系
         for node_id, node in nodes.items():
             for method in node.methods:
                 return_type = method.return_type
+                return_type_l = return_type.lower()
                 
                 # 查找对应的目标节点
-                for target_node_id, target_node in nodes.items():
-                    if node_id != target_node_id and \
-                       return_type.lower() in target_node.class_name.lower():
+                for target_node_id in _nodes_named_with(return_type_l, index):
+                    target_node = nodes[target_node_id]
+                    if node_id != target_node_id:
                         
-                        edge = GraphEdge(
-                            source_node_id=node_id,
-                            target_node_id=target_node_id,
-                            linkage_type=LinkageType.INVOCATION,
-                            source_method=method.name,
-                            description=f"{node.class_name}.{method.name} 方法返回 {target_node.class_name} 类型",
-                            confidence=0.8,
-                            evidence=[f"方法返回类型: {return_type}"]
-                        )
-                        
-                        if edge not in existing_edges:
-                            new_edges.append(edge)
+                        key = _edge_key(node_id, target_node_id, LinkageType.INVOCATION)
+                        if key not in seen:
+                            seen.add(key)
+                            new_edges.append(GraphEdge(
+                                source_node_id=node_id,
+                                target_node_id=target_node_id,
+                                linkage_type=LinkageType.INVOCATION,
+                                source_method=method.name,
+                                description=f"{node.class_name}.{method.name} 方法返回 {target_node.class_name} 类型",
+                                confidence=0.8,
+                                evidence=[f"方法返回类型: {return_type}"]
+                            ))
         
         # 3. 基于预置函数中的单位引用
-        for node_id, node in nodes.items():
-            prefab_candidates = getattr(node, 'prefab_function_candidates', [])
+        for node_id, prefab_candidates in capabilities.prefab_candidates.items():
+            node = nodes[node_id]
             for candidate in prefab_candidates:
                 function_name = candidate.get('function_name', '')
                 if function_name:
+                    function_name_l = function_name.lower()
                     # 查找函数名中提到的其他单位
-                    for target_node_id, target_node in nodes.items():
-                        if node_id != target_node_id and \
-                           target_node.class_name.lower() in function_name.lower():
-                            
-                            edge = GraphEdge(
-                                source_node_id=node_id,
-                                target_node_id=target_node_id,
-                                linkage_type=LinkageType.INVOCATION,
-                                source_method=function_name,
-                                description=f"{node.class_name} 的预置函数 {function_name} 引用了 {target_node.class_name}",
-                                confidence=0.85,
-                                evidence=[f"预置函数: {function_name}"]
-                            )
+                    for target_node_id in _nodes_mentioned_in(function_name_l, index, include_desc=False):
+                        target_node = nodes[target_node_id]
+                        if node_id != target_node_id:
                             
-                            if edge not in existing_edges:
-                                new_edges.append(edge)
+                            key = _edge_key(node_id, target_node_id, LinkageType.INVOCATION)
+                            if key not in seen:
+                                seen.add(key)
+                                new_edges.append(GraphEdge(
+                                    source_node_id=node_id,
+                                    target_node_id=target_node_id,
+                                    linkage_type=LinkageType.INVOCATION,
+                                    source_method=function_name,
+                                    description=f"{node.class_name} 的预置函数 {function_name} 引用了 {target_node.class_name}",
+                                    confidence=0.85,
+                                    evidence=[f"预置函数: {function_name}"]
+                                ))
         
         return new_edges
     
+    def reset(self) -> None:
+        """清空各阶段共用的预处理结果，下一次执行阶段时按当前节点重新构建"""
+        self._context_cache = None
+    
+    def _get_phase_context(self, nodes: Dict[str, GraphNode]) -> PhaseContext:
+        """获取各阶段共用的预处理结果，同一次遍历中节点集合未变化时复用上一阶段的结果"""
+        # 键中持有节点对象本身（GraphNode 按对象标识比较），避免 id() 被新节点复用
+        cache_key = tuple(nodes.items())
+        if self._context_cache is None or self._context_cache[0] != cache_key:
+            self._context_cache = (cache_key, _build_phase_context(nodes))
+        return self._context_cache[1]
+    
     def execute_phase(self, phase: TraversalPhase, nodes: Dict[str, GraphNode],
                      existing_edges: Set[GraphEdge], edge_history: Dict[TraversalPhase, List[GraphEdge]]) -> List[GraphEdge]:
-        """执行指定的遍历阶段"""
-        linkage_types = self.get_linkage_types_for_phase(phase)
-        
-        # 获取历史边数据
-        interaction_edges = edge_history.get(TraversalPhase.PHASE_1_INTERACTION, [])
-        combination_edges = edge_history.get(TraversalPhase.PHASE_2_COMBINATION, [])
-        association_edges = edge_history.get(TraversalPhase.PHASE_3_ASSOCIATION, [])
-        dependency_edges = edge_history.get(TraversalPhase.PHASE_4_DEPENDENCY, [])
-        
-        # 根据阶段执行相应的识别逻辑
-        if phase == TraversalPhase.PHASE_1_INTERACTION:
-            new_edges = self.identify_interaction_links(nodes, existing_edges)
-        elif phase == TraversalPhase.PHASE_2_COMBINATION:
-            new_edges = self.identify_combination_links(nodes, existing_edges, interaction_edges)
-        elif phase == TraversalPhase.PHASE_3_ASSOCIATION:
-            new_edges = self.identify_association_links(nodes, existing_edges, 
-                                                       interaction_edges, combination_edges)
-        elif phase == TraversalPhase.PHASE_4_DEPENDENCY:
-            new_edges = self.identify_dependency_links(nodes, existing_edges,
-                                                      interaction_edges, combination_edges,
-                                                      association_edges)
-        elif phase == TraversalPhase.PHASE_5_INVOCATION:
-            new_edges = self.identify_invocation_links(nodes, existing_edges,
-                                                      interaction_edges, combination_edges,
-                                                      association_edges, dependency_edges)
-        else:
-            new_edges = []
+        """执行指定的遍历阶段
+        
+        edge_history 为各阶段已发现的边；当前各阶段的识别逻辑均不依赖之前阶段的边，
+        保留该参数供调用方传入及后续阶段使用。
+        """
+        # 根据阶段查表获取相应的识别逻辑
+        handler = self._phase_handlers.get(phase)
+        if handler is None:
+            return []
+        
+        # 小写类名/描述、按可选属性的节点分组等预处理只做一次，供本次遍历的所有阶段共用；
+        # 第一个阶段开始新的遍历，节点属性可能已在两次遍历之间被修改，需重新构建
+        if phase is self.traversal_order[0]:
+            self.reset()
+        ctx = self._get_phase_context(nodes)
+        
+        new_edges = handler(nodes, existing_edges, ctx)
         
         # 设置发现轮次
         for edge in new_edges:
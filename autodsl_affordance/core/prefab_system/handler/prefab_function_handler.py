@@ -1,7 +1,20 @@
+import heapq
 import logging
-from typing import List, Dict, Any, Tuple, Optional
-from dataclasses import dataclass
+import re
+import sys
+from collections import Counter, deque
+from functools import lru_cache
+from operator import itemgetter
+from typing import List, Dict, Any, Set, Tuple, Optional
+from dataclasses import dataclass, field
 from enum import Enum
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    # 未安装 numba 时使用 NumPy 向量运算调整评分
+    njit = None
 from autodsl_affordance.core.prefab_system.handler.prefab_performance_monitor import PrefabPerformanceMonitor
 
 class SynergyType(Enum):
@@ -12,7 +25,7 @@ class SynergyType(Enum):
     ARMOR_TYPE_COORDINATION = "armor_type_coordination"
     SUPPORT_DPS_COORDINATION = "support_dps_coordination"
 
-@dataclass
+@dataclass(slots=True)
 class SynergyScore:
     """协同评分"""
     function_id: str
@@ -86,11 +99,15 @@ try:
     from vlm_attention.env.config import get_unit_name
 except ImportError:
     # Fallback if the function is not available
-    def get_unit_name(unit_type: int) -> str:
-        """Fallback function to convert integer unit IDs to string names"""
-        return COMMON_UNIT_IDS.get(unit_type, str(unit_type))
+    class _UnitNameTable(dict):
+        """Unit ID to name table; unknown IDs map to their string form"""
+        def __missing__(self, unit_type):
+            return str(unit_type)
+    
+    # Bound lookup: known IDs resolve in C without a Python call frame
+    get_unit_name = _UnitNameTable(COMMON_UNIT_IDS).__getitem__
 
-@dataclass
+@dataclass(slots=True)
 class UnitInfo:
     """单位信息"""
     unit_type: str
@@ -100,6 +117,380 @@ class UnitInfo:
     shield: float
     is_alive: bool = True
 
+@dataclass(slots=True)
+class _ObservationUnits:
+    """单次观察中按阵营划分的单位及其派生数据"""
+    friendly_units: List[Dict[str, Any]]
+    enemy_units: List[Dict[str, Any]]
+    friendly_unit_types: Set[str]          # 友方基础单位类型（去掉数字后缀）
+    friendly_names_lower: List[str]        # 友方单位名称（小写）
+    enemy_names_lower: List[str]           # 敌方单位名称（小写）
+    friendly_bases_lower: Set[str] = field(default_factory=set)   # 友方基础单位类型（小写）
+    enemy_bases_lower: Set[str] = field(default_factory=set)      # 敌方基础单位类型（小写）
+    race: Optional[str] = None                                    # 检测到的我方种族，None表示尚未检测
+    race_default: Optional[str] = None                            # 检测种族时使用的默认种族
+    _friendly_hits: Dict[str, bool] = field(default_factory=dict)
+    _enemy_hits: Dict[str, bool] = field(default_factory=dict)
+    
+    def has_friendly(self, name_lower: str) -> bool:
+        """判断小写名称是否出现在某个友方单位名称中（子串语义，结果按名称缓存）"""
+        # 命中基础类型即为某单位名称的前缀，无需扫描
+        if name_lower in self.friendly_bases_lower:
+            return True
+        hit = self._friendly_hits.get(name_lower)
+        if hit is None:
+            hit = any(name_lower in name for name in self.friendly_names_lower)
+            self._friendly_hits[name_lower] = hit
+        return hit
+    
+    def has_enemy(self, name_lower: str) -> bool:
+        """判断小写名称是否出现在某个敌方单位名称中（子串语义，结果按名称缓存）"""
+        if name_lower in self.enemy_bases_lower:
+            return True
+        hit = self._enemy_hits.get(name_lower)
+        if hit is None:
+            hit = any(name_lower in name for name in self.enemy_names_lower)
+            self._enemy_hits[name_lower] = hit
+        return hit
+
+# 取单位字典中的单位名称
+_unit_name_of = itemgetter('unit_name')
+
+# 简化的单位分类：前线单位与支援单位（用于阵型评估）
+_FRONTLINE_UNIT_TYPES = frozenset({
+    'ProtossZealot', 'ProtossImmortal', 'ProtossArchon',
+    'TerranMarine', 'TerranMarauder', 'TerranSiegeTank', 'TerranThor',
+    'ZergZergling', 'ZergRoach', 'ZergUltralisk'
+})
+_POSITIONING_SUPPORT_UNIT_TYPES = frozenset({
+    'ProtossHighTemplar', 'ProtossSentry', 'ProtossObserver',
+    'TerranMedivac', 'TerranRaven', 'TerranGhost',
+    'ZergQueen', 'ZergInfestor', 'ZergViper'
+})
+
+# 协同适配性评估使用的单位类型集合
+_AIR_UNITS = frozenset({
+    'ProtossPhoenix', 'ProtossCorsair', 'ProtossCarrier',
+    'TerranViking', 'TerranBanshee', 'TerranBattlecruiser',
+    'ZergMutalisk', 'ZergCorruptor'
+})
+_GROUND_UNITS = frozenset({
+    'ProtossZealot', 'ProtossStalker', 'ProtossSentry',
+    'TerranMarine', 'TerranMarauder', 'TerranSiegeTank',
+    'ZergZergling', 'ZergRoach', 'ZergUltralisk'
+})
+_HIGH_VALUE_TARGET_UNITS = frozenset({'TerranSiegeTank', 'TerranThor', 'ZergUltralisk', 'ProtossColossus'})
+_MELEE_UNITS = frozenset({'ProtossZealot', 'ProtossDarkTemplar', 'TerranMarine', 'ZergZergling', 'ZergBaneling'})
+_RANGED_UNITS = frozenset({
+    'ProtossStalker', 'ProtossImmortal', 'TerranMarauder',
+    'TerranSiegeTank', 'ZergHydralisk', 'ZergLurker'
+})
+_ABILITY_UNITS = frozenset({
+    'ProtossHighTemplar', 'ProtossSentry', 'TerranGhost',
+    'TerranMedivac', 'ZergInfestor', 'ZergQueen'
+})
+_ABILITY_SUPPORT_UNITS = frozenset({'ProtossSentry', 'ProtossZealot', 'TerranMedivac', 'ZergQueen'})
+_SPECIALIZED_UNITS = frozenset({'ProtossImmortal', 'ProtossColossus', 'TerranSiegeTank', 'TerranThor', 'ZergUltralisk'})
+_SUPPORT_UNITS = frozenset({
+    'ProtossSentry', 'ProtossHighTemplar', 'ProtossObserver',
+    'TerranMedivac', 'TerranRaven', 'ZergQueen', 'ZergInfestor'
+})
+_DPS_UNITS = frozenset({
+    'ProtossZealot', 'ProtossStalker', 'ProtossDarkTemplar',
+    'TerranMarine', 'TerranMarauder', 'ZergZergling', 'ZergHydralisk'
+})
+# 敌方威胁单位：高威胁计2分，中威胁计1分
+_HIGH_THREAT_UNITS = frozenset({'TerranGhost', 'TerranRaven', 'ZergViper', 'ProtossHighTemplar'})
+_MEDIUM_THREAT_UNITS = frozenset({'TerranBattlecruiser', 'ZergUltralisk', 'ProtossColossus'})
+
+# 种族检测关键字（子串匹配），按 protoss、terran、zerg 的顺序检测
+_RACE_KEYWORD_RES = (
+    ('protoss', re.compile('|'.join(map(re.escape, [
+        'zealot', 'stalker', 'phoenix', 'immortal', 'archon', 'sentry', 'hightemplar', 'darktemplar',
+        'colossus', 'observer', 'warp prism', 'carrier', 'tempest', 'void ray', 'protoss'
+    ])))),
+    ('terran', re.compile('|'.join(map(re.escape, [
+        'marine', 'marauder', 'reaper', 'ghost', 'hellbat', 'siegetank', 'thor', 'medivac',
+        'viking', 'banshee', 'raven', 'battlecruiser', 'liberator', 'terran'
+    ])))),
+    ('zerg', re.compile('|'.join(map(re.escape, [
+        'zergling', 'baneling', 'roach', 'ravager', 'hydralisk', 'lurker', 'mutalisk', 'corruptor',
+        'viper', 'ultralisk', 'infestor', 'swarm host', 'brood lord', 'queen', 'drone', 'overlord', 'zerg'
+    ]))))
+)
+
+# 友方单位数量达到该值时才用 NumPy 计算地形统计量，数量较少时逐单位计算
+_NUMPY_TERRAIN_MIN_UNITS = 32
+
+def _terrain_stats_scalar(friendly_units: List[UnitInfo], enemy_units: List[UnitInfo]) -> Tuple[Any, ...]:
+    """
+    逐单位计算地形分析所需的统计量（友方单位非空）
+    
+    Returns:
+        (友方x/y方差（不足3个单位时为None）, 友方平均y, 敌方平均y, 友方单位间平均距离（不足2个单位时为None），
+         友方不同x坐标数, 友方不同y坐标数)
+    """
+    friendly_positions = [unit.position for unit in friendly_units]
+    enemy_positions = [unit.position for unit in enemy_units]
+    count = len(friendly_positions)
+    
+    variance = None
+    if count >= 3:
+        avg_x = sum(pos[0] for pos in friendly_positions) / count
+        avg_y = sum(pos[1] for pos in friendly_positions) / count
+        variance = (sum((pos[0] - avg_x)**2 for pos in friendly_positions) / count,
+                    sum((pos[1] - avg_y)**2 for pos in friendly_positions) / count)
+    
+    avg_friendly_y = sum(pos[1] for pos in friendly_positions) / count
+    avg_enemy_y = sum(pos[1] for pos in enemy_positions) / len(enemy_positions) if enemy_positions else 0
+    
+    avg_distance = None
+    if count >= 2:
+        distances = [((p[0] - q[0])**2 + (p[1] - q[1])**2)**0.5
+                     for i, p in enumerate(friendly_positions) for q in friendly_positions[i + 1:]]
+        avg_distance = sum(distances) / len(distances)
+    
+    return (variance, avg_friendly_y, avg_enemy_y, avg_distance,
+            len({pos[0] for pos in friendly_positions}), len({pos[1] for pos in friendly_positions}))
+
+def _terrain_stats_numpy(friendly_positions: np.ndarray, enemy_positions: np.ndarray) -> Tuple[Any, ...]:
+    """
+    用坐标数组计算地形分析所需的统计量，返回值同 _terrain_stats_scalar
+    """
+    count = len(friendly_positions)
+    variance = friendly_positions.var(axis=0) if count >= 3 else None
+    avg_friendly_y = friendly_positions[:, 1].mean()
+    avg_enemy_y = enemy_positions[:, 1].mean() if len(enemy_positions) else 0
+    
+    avg_distance = None
+    if count >= 2:
+        # 每对单位只计一次
+        rows, cols = np.triu_indices(count, 1)
+        pair_diff = friendly_positions[rows] - friendly_positions[cols]
+        avg_distance = np.sqrt((pair_diff * pair_diff).sum(axis=-1)).mean()
+    
+    return (variance, avg_friendly_y, avg_enemy_y, avg_distance,
+            np.unique(friendly_positions[:, 0]).size, np.unique(friendly_positions[:, 1]).size)
+
+# 友方单位数量达到该值时才使用 numba 阵型内核，数量较少时直接逐单位计算
+_NUMBA_MIN_UNITS = 32
+
+if njit is not None:
+    @njit(cache=True)
+    def _positioning_kernel(friendly_xy, frontline_mask, support_mask, enemy_xy):
+        """
+        numba 内核：一次遍历友方单位累计前线/支援单位坐标，返回
+        (前线凝聚力, 支援单位位于前线后方, 侧翼潜力)；按原顺序逐项累加，不启用 fastmath
+        """
+        n = friendly_xy.shape[0]
+        frontline_count = 0
+        frontline_sum_x = 0.0
+        frontline_sum_y = 0.0
+        support_count = 0
+        support_sum_y = 0.0
+        for i in range(n):
+            if frontline_mask[i]:
+                frontline_count += 1
+                frontline_sum_x += friendly_xy[i, 0]
+                frontline_sum_y += friendly_xy[i, 1]
+            if support_mask[i]:
+                support_count += 1
+                support_sum_y += friendly_xy[i, 1]
+        
+        # 1. 前线凝聚力：前线单位与平均x坐标的偏差，偏差越小越好
+        cohesion = 0.0
+        avg_frontline_y = 0.0
+        if frontline_count > 0:
+            avg_x = frontline_sum_x / frontline_count
+            deviation = 0.0
+            for i in range(n):
+                if frontline_mask[i]:
+                    deviation += abs(friendly_xy[i, 0] - avg_x)
+            cohesion = max(0.0, min(1.0, 1.0 - (deviation / frontline_count) / 50.0))
+            avg_frontline_y = frontline_sum_y / frontline_count
+        
+        # 2. 支援单位位于前线后方（y值越高越靠后）
+        support_behind = 0.0
+        if frontline_count > 0 and support_count > 0:
+            if support_sum_y / support_count > avg_frontline_y:
+                support_behind = 1.0
+            else:
+                behind = 0
+                for i in range(n):
+                    if support_mask[i] and friendly_xy[i, 1] > avg_frontline_y:
+                        behind += 1
+                support_behind = behind / support_count
+        
+        # 3. 侧翼潜力：位于敌人左右两侧超过一定距离、且与敌人平均y坐标接近的友方单位比例
+        m = enemy_xy.shape[0]
+        enemy_sum_y = 0.0
+        enemy_left = enemy_xy[0, 0]
+        enemy_right = enemy_xy[0, 0]
+        for j in range(m):
+            enemy_sum_y += enemy_xy[j, 1]
+            enemy_left = min(enemy_left, enemy_xy[j, 0])
+            enemy_right = max(enemy_right, enemy_xy[j, 0])
+        avg_enemy_y = enemy_sum_y / m
+        flank_distance = (enemy_right - enemy_left) * 0.5
+        flanking = 0
+        for i in range(n):
+            x = friendly_xy[i, 0]
+            if (x < enemy_left - flank_distance or x > enemy_right + flank_distance) and \
+                    abs(friendly_xy[i, 1] - avg_enemy_y) < flank_distance:
+                flanking += 1
+        flanking_potential = min(1.0, flanking / n * 2.0)
+        
+        return cohesion, support_behind, flanking_potential
+else:
+    _positioning_kernel = None
+
+def _positions_array(units: List[Any]) -> np.ndarray:
+    """将单位坐标转换为 (n, 2) 的 float64 数组（只取x、y）"""
+    if not units:
+        return np.empty((0, 2), dtype=np.float64)
+    return np.array([unit.position for unit in units], dtype=np.float64).reshape(len(units), -1)[:, :2]
+
+@dataclass(slots=True)
+class _UnitArrays:
+    """单位列表的列式（SoA）视图：坐标与单位类型"""
+    xy: np.ndarray                  # (n, 2) float64 坐标
+    unit_types: Tuple[str, ...]     # 按原顺序的单位类型
+    type_set: Set[str]              # 出现过的单位类型
+    units: List[Any]                # 生成视图的原列表，用于判断视图是否仍对应该列表
+
+def _build_unit_arrays(units: List[Any]) -> _UnitArrays:
+    """从 UnitInfo 列表构建列式视图"""
+    unit_types = tuple(unit.unit_type for unit in units)
+    return _UnitArrays(
+        xy=_positions_array(units),
+        unit_types=unit_types,
+        type_set=set(unit_types),
+        units=units
+    )
+
+# 多样性惩罚系数：最近5步中使用k次的函数评分乘以0.95**k
+_DIVERSITY_DECAY = tuple(0.95 ** k for k in range(6))
+_DIVERSITY_DECAY_ARRAY = np.array(_DIVERSITY_DECAY, dtype=np.float64)
+
+# 候选函数数量达到该值时才使用 numba 内核，数量较少时编译后调用的开销不划算
+_NUMBA_MIN_FUNCTIONS = 256
+
+if njit is not None:
+    @njit(cache=True)
+    def _history_adjusted_scores_kernel(base_scores, usage_counts, cooldowns, success_rates, decay):
+        """numba 内核：按多样性、冷却时间、执行成功率依次调整评分（不启用 fastmath，保证与逐项相乘结果一致）"""
+        n = base_scores.shape[0]
+        out = np.empty(n, dtype=np.float64)
+        for i in range(n):
+            score = base_scores[i] * decay[usage_counts[i]]
+            if cooldowns[i] > 0:
+                score *= 0.8 + cooldowns[i] / 10.0
+            out[i] = score * (0.5 + success_rates[i] * 0.5)
+        return out
+else:
+    _history_adjusted_scores_kernel = None
+
+def _history_adjusted_scores(base_scores: List[float], usage_counts: List[int],
+                             cooldowns: List[int], success_rates: List[float]) -> List[float]:
+    """
+    根据执行历史批量调整评分
+    
+    依次乘以多样性惩罚（最近5步使用次数）、冷却惩罚（剩余冷却步数大于0时）和执行成功率系数；
+    无执行记录的函数成功率按1.0传入，系数恰为1.0
+    """
+    base = np.asarray(base_scores, dtype=np.float64)
+    usage = np.asarray(usage_counts, dtype=np.int64)
+    cooldown = np.asarray(cooldowns, dtype=np.float64)
+    success = np.asarray(success_rates, dtype=np.float64)
+    if _history_adjusted_scores_kernel is not None and base.shape[0] >= _NUMBA_MIN_FUNCTIONS:
+        return _history_adjusted_scores_kernel(base, usage, cooldown, success, _DIVERSITY_DECAY_ARRAY).tolist()
+    scores = base * _DIVERSITY_DECAY_ARRAY[usage]
+    scores *= np.where(cooldown > 0, 0.8 + cooldown / 10.0, 1.0)
+    scores *= 0.5 + success * 0.5
+    return scores.tolist()
+
+# 种族名称，按检测优先级排列
+_RACES = ('terran', 'protoss', 'zerg')
+_RACE_RE = re.compile('|'.join(_RACES))
+
+# 纯移动函数判定：名称中的纯移动词汇、允许的战术性移动词汇、执行流程中的移动指令
+_PURE_MOVE_KEYWORDS = ('move', 'move_to_position', 'position_move', 'navigate')
+_ALLOWED_MOVE_KEYWORDS = ('push', 'retreat', 'advance', 'withdraw', 'flank', 'mm_push')
+_PURE_MOVE_RE = re.compile('|'.join(map(re.escape, _PURE_MOVE_KEYWORDS)))
+_ALLOWED_MOVE_RE = re.compile('|'.join(map(re.escape, _ALLOWED_MOVE_KEYWORDS)))
+_MOVE_EXECUTION_RE = re.compile(r'move_to_position|move\(')
+
+# 通用单位类型：源单位/所需单位为这些值时直接通过检查
+_GENERIC_FRIENDLY_UNITS = frozenset(['all_friendly', 'all_ground_friendly', 'friendly_infantry', 'all_mechanical', 'all_infantry'])
+# 通用目标类型：目标单位为这些值时直接通过检查
+_GENERIC_TARGET_UNITS = frozenset(['high_value_enemy_unit', 'high_value_terran_unit', 'nearest_enemy', 'nearest_enemy_unit', 'highest_threat_enemy', 'lowest_health_enemy', 'armored_enemy', 'light_enemy', 'lowest_health_friendly', 'all_enemy', 'closest_enemy'])
+
+def _race_in(text_lower: str) -> str:
+    """
+    返回小写文本中出现的种族名称，多个种族同时出现时按_RACES顺序取第一个；未出现返回空字符串
+    """
+    # 绝大多数文本不含种族名称，一次正则扫描即可排除
+    if _RACE_RE.search(text_lower) is None:
+        return ""
+    return next(race for race in _RACES if race in text_lower)
+
+# 函数中引用单位时可能带的种族前缀（如TerranMarine），及标准化名称中的小写形式
+_RACE_PREFIXES = ('Terran', 'Protoss', 'Zerg')
+_RACE_PREFIXES_LOWER = ('protoss', 'terran', 'zerg')
+
+def _strip_race_prefix(name: str, prefixes: Tuple[str, ...] = _RACE_PREFIXES) -> Optional[str]:
+    """去掉名称开头的种族前缀（如TerranMarine -> Marine），没有种族前缀时返回None"""
+    for race_prefix in prefixes:
+        if name.startswith(race_prefix):
+            return name[len(race_prefix):]
+    return None
+
+# 标准化单位名称时去掉的分隔符
+_NAME_SEPARATOR_TABLE = str.maketrans('', '', ' _')
+
+@lru_cache(maxsize=2048)
+def _canonical_unit_name(unit_name: str) -> str:
+    """单位名称的标准形式：去除空格、下划线、种族前缀和数字，转为小写（按名称缓存）"""
+    normalized = unit_name.translate(_NAME_SEPARATOR_TABLE).lower()
+    base_name = _strip_race_prefix(normalized, _RACE_PREFIXES_LOWER)
+    if base_name is not None:
+        normalized = base_name
+    return ''.join([c for c in normalized if not c.isdigit()])
+
+@dataclass(slots=True)
+class _FuncMeta:
+    """预制函数中与观察无关的静态特征，按function_id缓存（置信度会随执行结果更新，不在其中）"""
+    func: Dict[str, Any]                                   # 对应的函数字典，用于校验缓存
+    name_lower: str                                        # 函数名称（小写）
+    execution_flow_lower: str                              # 执行流程字符串（小写）
+    is_pure_move: bool                                     # 是否为纯移动函数（WithoutMove模式下跳过）
+    race: str                                              # 函数种族，未指定为空字符串
+    source_candidates: Optional[Tuple[str, ...]]           # 源单位匹配形式，None表示无需检查
+    target_candidates: Optional[Tuple[str, ...]]           # 目标单位匹配形式，None表示无需检查
+    required_candidates: Tuple[Tuple[str, ...], ...]       # 各非通用所需单位的匹配形式
+    targeting_bases: Optional[Tuple[str, str]]             # 目标设置函数的源/目标基础单位类型
+    tactic_category: str
+    function_type: str
+    is_combination: bool
+
+@lru_cache(maxsize=1024)
+def _unit_name_candidates(unit_ref: str, include_full: bool) -> Tuple[str, ...]:
+    """
+    预先计算函数中单位引用的各种小写匹配形式
+    
+    依次为：基础名称（'_'后的最后一段）、去掉种族前缀后的名称（TerranMarine -> marine）、
+    完整名称（include_full为True时）
+    """
+    unit_base = unit_ref.rsplit('_', 1)[-1]
+    candidates = [unit_base.lower()]
+    if len(unit_base) > 5:  # 排除太短的单位名称
+        race_removed = _strip_race_prefix(unit_base)
+        if race_removed is not None:
+            candidates.append(race_removed.lower())
+    if include_full and unit_ref != unit_base:
+        candidates.append(unit_ref.lower())
+    return tuple(candidates)
+
 logger = logging.getLogger(__name__)
 
 class PrefabFunctionHandler:
@@ -125,16 +516,32 @@ class PrefabFunctionHandler:
         self.prefab_function_cooldowns = {}
         # 执行结果记录
         self.prefab_execution_results = []
+        # 每个函数最近5次执行是否成功，供评分时直接查询
+        self._recent_results_by_func: Dict[str, deque] = {}
+        # 预制函数静态特征缓存：function_id -> _FuncMeta
+        self._func_meta_cache: Dict[str, _FuncMeta] = {}
+        # 协同类预制函数缓存：(函数库修改计数, 函数列表)
+        self._coordination_functions_cache = None
         
         # 单位池管理
         self.unit_pool = {
             'friendly': [],
             'enemy': []
         }
+        # 单位池的列式视图，随 update_unit_pool 更新
+        self.unit_pool_np = {
+            'friendly': _build_unit_arrays([]),
+            'enemy': _build_unit_arrays([])
+        }
+        # 协同适配性单位特征缓存：(友方池视图, 敌方池视图, 特征字典)
+        self._unit_features_cache = None
         
         # 向后兼容标志
         self._legacy_mode = False
         
+        # 最近一次观察的单位划分缓存：(observation, unit_info, _ObservationUnits)
+        self._obs_cache = None
+        
         # 添加性能监控器
         self.performance_monitor = PrefabPerformanceMonitor()
         
@@ -142,6 +549,148 @@ class PrefabFunctionHandler:
         # from vlm_attention.utils.game_logger import GameLogger
         # self.game_logger = GameLogger('prefab_function_logger')
     
+    def _get_observation_units(self, observation: Dict[str, Any]) -> _ObservationUnits:
+        """
+        按阵营划分观察中的单位，同一观察（及同一 unit_info 列表）只划分一次
+        
+        缓存按观察对象、unit_info 列表及其长度判定，可检测到列表的追加/删除；
+        原地修改列表中某个单位字典（如改写 alliance/unit_name）不会被检测到，应传入新的观察。
+        
+        Args:
+            observation: 游戏观察数据
+            
+        Returns:
+            _ObservationUnits: 友方/敌方单位及其派生数据
+        """
+        unit_info = observation['unit_info']
+        cache = self._obs_cache
+        if cache is not None and cache[0] is observation and cache[1] is unit_info and cache[2] == len(unit_info):
+            return cache[3]
+        
+        # 驻留单位名称：同名单位共享同一字符串对象，后续的相等比较和集合/字典查找可直接按引用命中
+        for unit in unit_info:
+            unit['unit_name'] = sys.intern(unit['unit_name'])
+        
+        friendly_units = [unit for unit in unit_info if unit['alliance'] == 1]
+        enemy_units = [unit for unit in unit_info if unit['alliance'] != 1]
+        friendly_names = list(map(_unit_name_of, friendly_units))
+        friendly_names_lower = list(map(str.lower, friendly_names))
+        enemy_names_lower = [name.lower() for name in map(_unit_name_of, enemy_units)]
+        units = _ObservationUnits(
+            friendly_units=friendly_units,
+            enemy_units=enemy_units,
+            friendly_unit_types={sys.intern(name.split('_', 1)[0]) for name in friendly_names},
+            friendly_names_lower=friendly_names_lower,
+            enemy_names_lower=enemy_names_lower,
+            friendly_bases_lower={name.split('_', 1)[0] for name in friendly_names_lower},
+            enemy_bases_lower={name.split('_', 1)[0] for name in enemy_names_lower}
+        )
+        # 持有观察对象的引用，避免其被回收后 id 被新观察复用
+        self._obs_cache = (observation, unit_info, len(unit_info), units)
+        return units
+    
+    def _get_func_meta(self, func: Dict[str, Any]) -> _FuncMeta:
+        """
+        获取预制函数的静态特征，首次见到（或函数字典被替换）时计算并缓存
+        
+        Args:
+            func: 预制函数
+            
+        Returns:
+            _FuncMeta: 函数静态特征
+        """
+        func_id = func['function_id']
+        meta = self._func_meta_cache.get(func_id)
+        if meta is not None and meta.func is func:
+            return meta
+        
+        func_name = func['name']
+        func_name_lower = func_name.lower()
+        execution_flow_lower = str(func.get('execution_flow', '')).lower()
+        
+        # 检查函数是否适合WithoutMove模式
+        # 过滤掉明确要求move的函数，但保留与move相关但可以适配的战术性移动函数
+        # 医疗机相关函数不是纯移动函数
+        is_pure_move = False
+        if not ('medivac' in func_name_lower or 'heal_' in func_name_lower):
+            # 名称中包含纯移动词汇且不含战术性移动词汇，或执行流程中包含纯移动指令（mm_push除外）
+            # 短路求值：结论确定后不再扫描其余字符串
+            is_pure_move = (
+                (_PURE_MOVE_RE.search(func_name_lower) is not None and _ALLOWED_MOVE_RE.search(func_name_lower) is None)
+                or ('mm_push' not in func_name_lower and _MOVE_EXECUTION_RE.search(execution_flow_lower) is not None)
+            )
+        
+        # 检测预制函数的种族：依次从函数ID、函数名称、源单位、目标单位、执行流程中提取
+        race = _race_in(func_id.lower()) or _race_in(func_name_lower)
+        if not race and 'source_unit' in func:
+            race = _race_in(func['source_unit'].lower())
+        if not race and 'target_unit' in func:
+            race = _race_in(func['target_unit'].lower())
+        if not race:
+            race = _race_in(execution_flow_lower)
+        
+        # 源单位需为我方单位（通用单位类型除外）
+        source_candidates = None
+        if 'source_unit' in func and func['source_unit'] not in _GENERIC_FRIENDLY_UNITS:
+            source_candidates = _unit_name_candidates(func['source_unit'], True)
+        
+        # 目标单位需为敌方单位（通用目标类型除外）
+        target_candidates = None
+        if 'target_unit' in func and func['target_unit'] not in _GENERIC_TARGET_UNITS:
+            target_candidates = _unit_name_candidates(func['target_unit'], False)
+        
+        # 所需单位：prerequisites.required_units 与 units（兼容旧格式）
+        required_units = []
+        if 'prerequisites' in func and 'required_units' in func['prerequisites']:
+            required_units.extend(func['prerequisites']['required_units'])
+        if 'units' in func:
+            required_units.extend(func['units'])
+        required_candidates = tuple(
+            _unit_name_candidates(unit, True) for unit in required_units if unit not in _GENERIC_FRIENDLY_UNITS
+        )
+        
+        # 目标设置函数：提取源单位和目标单位的基础单位类型
+        targeting_bases = None
+        if 'target_' in func_name and 'source_unit' in func and 'target_unit' in func:
+            targeting_bases = (func['source_unit'].rsplit('_', 1)[-1], func['target_unit'].rsplit('_', 1)[-1])
+        
+        function_type = func.get('function_type', '')
+        meta = _FuncMeta(
+            func=func,
+            name_lower=func_name_lower,
+            execution_flow_lower=execution_flow_lower,
+            is_pure_move=is_pure_move,
+            race=race,
+            source_candidates=source_candidates,
+            target_candidates=target_candidates,
+            required_candidates=required_candidates,
+            targeting_bases=targeting_bases,
+            tactic_category=func.get('tactic_category', ''),
+            function_type=function_type,
+            is_combination=function_type == 'combination' or func.get('linkage_type', '') == 'combination'
+        )
+        self._func_meta_cache[func_id] = meta
+        return meta
+    
+    def _get_coordination_functions(self) -> List[Dict[str, Any]]:
+        """
+        获取异构协同和阵型控制协同类预制函数（保持函数库中的顺序），函数库修改后重新筛选
+        
+        Returns:
+            List[Dict[str, Any]]: 协同类预制函数列表
+        """
+        revision = getattr(self.prefab_function_manager, 'revision', None)
+        cache = self._coordination_functions_cache
+        if cache is not None and revision is not None and cache[0] == revision:
+            return cache[1]
+        
+        coordination_functions = [
+            func for func in self.prefab_function_manager.get_all_functions()
+            if func.get('tactic_category', '') in ('heterogeneous_coordination', 'formation_control_coordination')
+        ]
+        self._coordination_functions_cache = (revision, coordination_functions)
+        return coordination_functions
+    
     def retrieve_relevant_functions(self, observation: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
         基于当前游戏状态检索相关预制函数
@@ -154,42 +703,30 @@ class PrefabFunctionHandler:
         """
         prefab_functions = []
         
-        # 获取当前友方单位和敌方单位
-        friendly_units = [unit for unit in observation['unit_info'] if unit['alliance'] == 1]
-        
-        # 提取友方单位类型集合
-        friendly_unit_types = set()
-        for unit in friendly_units:
-            unit_name = unit['unit_name']
-            # 提取基础单位类型（去掉数字后缀）
-            base_unit_type = unit_name.split('_')[0]
-            friendly_unit_types.add(base_unit_type)
+        # 获取当前友方单位及友方单位类型集合（基础单位类型，去掉数字后缀）
+        units = self._get_observation_units(observation)
+        friendly_units = units.friendly_units
+        friendly_unit_types = units.friendly_unit_types
         
         # 1. 根据当前单位检索预制函数
+        # 同名单位的检索结果相同，每个检索键只查询一次（保持首次出现的顺序）
+        searched_keys = set()
         for unit in friendly_units:
             unit_name = unit['unit_name']
             # 提取基础单位类型（去掉数字后缀）
-            base_unit_type = unit_name.split('_')[0]
-            
-            # 搜索与该单位相关的预制函数，尝试多种匹配方式
-            unit_functions = []
-            
-            # 1.1 尝试精确匹配（带完整单位名）
-            unit_functions.extend(self.prefab_function_manager.search_functions(unit=unit_name))
-            
-            # 1.2 尝试匹配基础单位类型
-            unit_functions.extend(self.prefab_function_manager.search_functions(unit=base_unit_type))
+            base_unit_type = unit_name.split('_', 1)[0]
             
-            # 1.3 尝试带种族前缀的匹配（例如 Marine -> TerranMarine）
-            race_prefixed_unit = f"{unit_name.split('_')[0].capitalize()}{base_unit_type}"
-            unit_functions.extend(self.prefab_function_manager.search_functions(unit=race_prefixed_unit))
-            
-            prefab_functions.extend(unit_functions)
+            # 搜索与该单位相关的预制函数，尝试多种匹配方式：
+            # 精确匹配（带完整单位名）、基础单位类型、带种族前缀的匹配（例如 Marine -> TerranMarine）
+            race_prefixed_unit = f"{base_unit_type.capitalize()}{base_unit_type}"
+            for search_key in (unit_name, base_unit_type, race_prefixed_unit):
+                if search_key in searched_keys:
+                    continue
+                searched_keys.add(search_key)
+                prefab_functions.extend(self.prefab_function_manager.search_functions(unit=search_key))
         
-        # 2. 额外搜索所有异构协同函数
-        # 获取所有预制函数并筛选出异构协同函数
-        all_functions = self.prefab_function_manager.get_all_functions()
-        for func in all_functions:
+        # 2. 额外搜索所有异构协同函数和阵型控制协同函数
+        for func in self._get_coordination_functions():
             # 检查是否为异构协同函数
             tactic_category = func.get('tactic_category', '')
             if tactic_category == 'heterogeneous_coordination':
@@ -208,14 +745,11 @@ class PrefabFunctionHandler:
                     if all(req_unit in friendly_unit_types for req_unit in required_units):
                         prefab_functions.append(func)
         
-        # 去重
-        seen = set()
-        unique_prefab_functions = []
+        # 去重（按function_id保留首次出现的函数及其顺序）
+        unique_by_id = {}
         for func in prefab_functions:
-            func_id = func['function_id']
-            if func_id not in seen:
-                seen.add(func_id)
-                unique_prefab_functions.append(func)
+            unique_by_id.setdefault(func['function_id'], func)
+        unique_prefab_functions = list(unique_by_id.values())
         
         logger.info(f"检索到 {len(unique_prefab_functions)} 个相关预制函数")
         
@@ -248,37 +782,29 @@ class PrefabFunctionHandler:
         friendly_count = len(friendly_units)
         enemy_count = len(enemy_units)
         
-        # 分析单位类型
-        friendly_unit_types = {}
-        enemy_unit_types = {}
-        
-        # 详细单位类型映射
-        friendly_detailed_types = {}
-        enemy_detailed_types = {}
-        
+        # 分析单位类型：基础单位类型（去掉数字后缀）和详细单位类型的数量统计
+        friendly_names = list(map(_unit_name_of, friendly_units))
+        enemy_names = list(map(_unit_name_of, enemy_units))
+        friendly_detailed_types = Counter(friendly_names)
+        enemy_detailed_types = Counter(enemy_names)
+        friendly_unit_types = Counter(name.split('_', 1)[0] for name in friendly_names)
+        enemy_unit_types = Counter(name.split('_', 1)[0] for name in enemy_names)
+        
+        # 一次遍历友方单位，分析医疗运输机、健康状况和能量状况
+        # 每个标志一旦成立就不再检查对应字段，与逐项 any() 的短路行为一致
+        has_medivac = False
+        has_low_health_units = False
+        has_energy_units = False
+        high_energy_units = False
         for unit in friendly_units:
-            unit_type = unit['unit_name'].split('_')[0]  # 提取基础单位类型
-            friendly_unit_types[unit_type] = friendly_unit_types.get(unit_type, 0) + 1
-            
-            # 添加详细单位类型
-            detailed_type = unit['unit_name']
-            friendly_detailed_types[detailed_type] = friendly_detailed_types.get(detailed_type, 0) + 1
-        
-        for unit in enemy_units:
-            unit_type = unit['unit_name'].split('_')[0]  # 提取基础单位类型
-            enemy_unit_types[unit_type] = enemy_unit_types.get(unit_type, 0) + 1
-            
-            # 添加详细单位类型
-            detailed_type = unit['unit_name']
-            enemy_detailed_types[detailed_type] = enemy_detailed_types.get(detailed_type, 0) + 1
-        
-        # 分析单位健康状况
-        has_medivac = any('Medivac' in unit['unit_name'] for unit in friendly_units)
-        has_low_health_units = any(unit['health'] < unit['max_health'] * 0.5 for unit in friendly_units)
-        
-        # 分析单位能量状况
-        has_energy_units = any(unit['energy'] > 0 for unit in friendly_units)
-        high_energy_units = any(unit['energy'] > 50 for unit in friendly_units)
+            if not has_medivac and 'Medivac' in unit['unit_name']:
+                has_medivac = True
+            if not has_low_health_units and unit['health'] < unit['max_health'] * 0.5:
+                has_low_health_units = True
+            if not has_energy_units and unit['energy'] > 0:
+                has_energy_units = True
+            if not high_energy_units and unit['energy'] > 50:
+                high_energy_units = True
         
         # 分析单位类型比例
         unit_type_diversity = len(friendly_unit_types) / friendly_count if friendly_count > 0 else 0
@@ -309,182 +835,73 @@ class PrefabFunctionHandler:
         Returns:
             List[Tuple[Dict[str, Any], float]]: 带评分的预制函数列表
         """
-        # 分析游戏状态
-        friendly_units = [unit for unit in observation['unit_info'] if unit['alliance'] == 1]
-        enemy_units = [unit for unit in observation['unit_info'] if unit['alliance'] != 1]
+        # 分析游戏状态（单位划分与单位名称匹配按观察缓存）
+        units = self._get_observation_units(observation)
+        friendly_units = units.friendly_units
+        enemy_units = units.enemy_units
         game_state = self._analyze_game_state(friendly_units, enemy_units, observation)
         
-        # 检测当前种族
-        current_race = self._detect_race(friendly_units)
+        # 检测当前种族（同一观察只检测一次，默认种族变化时重新检测）
+        if units.race is None or units.race_default != self.default_race:
+            units.race = self._detect_race(friendly_units)
+            units.race_default = self.default_race
+        current_race = units.race
         
         logger.info(f"当前检测到的种族: {current_race}")
+        current_race_lower = current_race.lower() if current_race else current_race
+        
+        # 最近5步历史中各函数的使用次数
+        recent_usage = Counter(self.prefab_function_history[-5:])
         
-        # 为每个预制函数评分
-        scored_functions = []
+        # 评分前先筛掉纯移动函数（保留战术性移动函数）和种族不匹配的函数：
+        # 如果当前种族已检测，且预制函数明确指定了其他种族，跳过
+        candidates = []
         for func in prefab_functions:
+            meta = self._get_func_meta(func)
+            if meta.is_pure_move:
+                continue
+            if current_race_lower and meta.race and meta.race != current_race_lower:
+                continue
+            candidates.append((func, meta))
+        
+        # 逐函数的INFO日志只在启用时格式化
+        log_info = logger.isEnabledFor(logging.INFO)
+        
+        # 为每个预制函数评分：循环内计算基础评分，执行历史相关的调整统一批量计算
+        scored_funcs = []
+        base_scores = []
+        usage_counts = []
+        cooldowns = []
+        success_rates = []
+        for func, meta in candidates:
             func_id = func['function_id']
             func_name = func['name']
             score = 0.0
             
-            # 检查函数是否适合WithoutMove模式
-            # 过滤掉明确要求move的函数，但保留与move相关但可以适配的战术性移动函数
-            is_pure_move = False
+            if log_info and current_race_lower and meta.race:
+                logger.info(f"预制函数 {func_id} ({func_name}) 种族匹配，函数种族为{meta.race}，当前种族为{current_race}")
             
-            func_name_lower = func_name.lower()
-            
-            # 特殊处理医疗机相关函数，它们不是纯移动函数
-            if 'medivac' in func_name_lower or 'heal_' in func_name_lower:
-                # 医疗机相关函数不是纯移动函数，直接通过
-                pass
-            else:
-                # 检查函数名称中是否包含纯移动相关词汇
-                pure_move_keywords = ['move', 'move_to_position', 'position_move', 'navigate']
-                allowed_move_keywords = ['push', 'retreat', 'advance', 'withdraw', 'flank', 'mm_push']
-                
-                has_pure_move = any(keyword in func_name_lower for keyword in pure_move_keywords)
-                has_allowed_move = any(keyword in func_name_lower for keyword in allowed_move_keywords)
-                
-                # 检查执行流程中是否包含纯移动指令
-                execution_flow = str(func.get('execution_flow', '')).lower()
-                has_move_execution = 'move_to_position' in execution_flow or 'move(' in execution_flow
-                has_allowed_execution = 'mm_push' in func_name_lower
-                
-                # 综合判断是否为纯移动函数
-                if has_pure_move and not has_allowed_move:
-                    is_pure_move = True
-                elif has_move_execution and not has_allowed_execution:
-                    is_pure_move = True
-                
-                if is_pure_move:
-                    # 跳过纯移动函数，保留战术性移动函数
+            # 检查源单位是否为我方单位（依次尝试基础名称、去掉种族前缀和完整名称的小写形式）
+            if meta.source_candidates is not None:
+                if not any(units.has_friendly(c) for c in meta.source_candidates):
+                    # 源单位不是我方单位，跳过该函数
                     continue
             
-            # 种族匹配检查：如果当前种族已检测，跳过不匹配的预制函数
-            if current_race:
-                # 检测预制函数的种族
-                func_race = ""
-                
-                # 从函数ID中提取种族
-                func_id_upper = func_id.upper()
-                if 'TERRAN' in func_id_upper:
-                    func_race = "terran"
-                elif 'PROTOSS' in func_id_upper:
-                    func_race = "protoss"
-                elif 'ZERG' in func_id_upper:
-                    func_race = "zerg"
-                
-                # 从函数名称中提取种族
-                if not func_race:
-                    if any(race in func_name_lower for race in ['terran', 'protoss', 'zerg']):
-                        func_race = next(race for race in ['terran', 'protoss', 'zerg'] if race in func_name_lower)
-                
-                # 从源单位中提取种族
-                if not func_race and 'source_unit' in func:
-                    source_unit_lower = func['source_unit'].lower()
-                    if any(race in source_unit_lower for race in ['terran', 'protoss', 'zerg']):
-                        func_race = next(race for race in ['terran', 'protoss', 'zerg'] if race in source_unit_lower)
-                
-                # 从目标单位中提取种族
-                if not func_race and 'target_unit' in func:
-                    target_unit_lower = func['target_unit'].lower()
-                    if any(race in target_unit_lower for race in ['terran', 'protoss', 'zerg']):
-                        func_race = next(race for race in ['terran', 'protoss', 'zerg'] if race in target_unit_lower)
-                
-                # 从执行流程中提取种族
-                if not func_race:
-                    execution_flow_lower = str(func.get('execution_flow', '')).lower()
-                    if any(race in execution_flow_lower for race in ['terran', 'protoss', 'zerg']):
-                        func_race = next(race for race in ['terran', 'protoss', 'zerg'] if race in execution_flow_lower)
-                
-                # 如果预制函数明确指定了种族，且与当前种族不匹配，跳过
-                if func_race and func_race != current_race.lower():
-                    # logger.info(f"跳过预制函数 {func_id} ({func_name}): 种族不匹配，函数种族为{func_race}，当前种族为{current_race}")
+            # 检查目标单位是否为敌方单位（依次尝试基础名称和去掉种族前缀后的名称）
+            if meta.target_candidates is not None:
+                if not any(units.has_enemy(c) for c in meta.target_candidates):
+                    # 目标单位不是敌方单位，跳过该函数
                     continue
-                elif func_race:
-                    logger.info(f"预制函数 {func_id} ({func_name}) 种族匹配，函数种族为{func_race}，当前种族为{current_race}")
-            
-            # 检查源单位是否为我方单位
-            if 'source_unit' in func:
-                source_unit = func['source_unit']
-                # 特殊处理通用单位类型
-                if source_unit in ['all_friendly', 'all_ground_friendly', 'friendly_infantry', 'all_mechanical', 'all_infantry']:
-                    # 通用单位类型直接通过检查
-                    has_source = True
-                else:
-                    # 提取基础单位类型，支持从TerranMarine中提取Marine
-                    # 方法：如果单位名称包含'_',则取最后一部分；否则，尝试匹配全名或提取种族后的部分
-                    if '_' in source_unit:
-                        source_base = source_unit.split('_')[-1]
-                    else:
-                        # 尝试直接匹配全名
-                        source_base = source_unit
-                    
-                    # 检查源单位是否是我方拥有的单位
-                    has_source = any(source_base.lower() in u['unit_name'].lower() for u in friendly_units)
-                    
-                    # 如果直接匹配失败，尝试提取种族前缀后的部分（如TerranMarine -> Marine）
-                    if not has_source and len(source_base) > 5:  # 排除太短的单位名称
-                        # 尝试去掉种族前缀（Terran, Protoss, Zerg）
-                        for race_prefix in ['Terran', 'Protoss', 'Zerg']:
-                            if source_base.startswith(race_prefix):
-                                race_removed = source_base[len(race_prefix):]
-                                has_source = any(race_removed.lower() in u['unit_name'].lower() for u in friendly_units)
-                                if has_source:
-                                    break
-                    
-                    # 尝试更灵活的匹配：检查源单位的小写形式是否包含在单位名称的小写形式中
-                    if not has_source:
-                        source_lower = source_unit.lower()
-                        has_source = any(source_lower in u['unit_name'].lower() for u in friendly_units)
-                    
-                    if not has_source:
-                        # 源单位不是我方单位，跳过该函数
-                        # logger.info(f"跳过预制函数 {func_id} ({func_name}): 源单位 {source_unit} 不是我方单位")
-                        continue
-            
-            # 检查目标单位是否为敌方单位
-            if 'target_unit' in func:
-                target_unit = func['target_unit']
-                # 如果是通用目标类型，允许
-                if target_unit not in ['high_value_enemy_unit', 'high_value_terran_unit', 'nearest_enemy', 'nearest_enemy_unit', 'highest_threat_enemy', 'lowest_health_enemy', 'armored_enemy', 'light_enemy', 'lowest_health_friendly', 'all_enemy', 'closest_enemy']:
-                    # 提取基础单位类型，支持从ProtossColossus中提取Colossus
-                    if '_' in target_unit:
-                        target_base = target_unit.split('_')[-1]
-                    else:
-                        target_base = target_unit
-                    
-                    # 检查目标单位是否是敌方单位类型
-                    has_enemy_target = any(target_base.lower() in unit['unit_name'].lower() for unit in enemy_units)
-                    
-                    # 如果直接匹配失败，尝试提取种族前缀后的部分（如ProtossColossus -> Colossus）
-                    if not has_enemy_target and len(target_base) > 5:  # 排除太短的单位名称
-                        # 尝试去掉种族前缀（Terran, Protoss, Zerg）
-                        for race_prefix in ['Terran', 'Protoss', 'Zerg']:
-                            if target_base.startswith(race_prefix):
-                                race_removed = target_base[len(race_prefix):]
-                                has_enemy_target = any(race_removed.lower() in unit['unit_name'].lower() for unit in enemy_units)
-                                if has_enemy_target:
-                                    break
-                    
-                    if not has_enemy_target:
-                        # 目标单位不是敌方单位，跳过该函数
-                        # logger.info(f"跳过预制函数 {func_id} ({func_name}): 目标单位 {target_unit} 不是敌方单位")
-                        continue
             
-            # 1. 基于函数置信度评分
+            # 1. 基于函数置信度评分（置信度随执行结果更新，不缓存）
             if 'confidence' in func:
                 score += func['confidence'] * 5.0
             
             # 2. 基于函数名称和游戏状态评分（按种族优化）
             if 'target_' in func_name:
                 # 目标设置函数：检查源单位和目标单位是否存在
-                if 'source_unit' in func and 'target_unit' in func:
-                    source_unit = func['source_unit']
-                    target_unit = func['target_unit']
-                    
-                    # 提取基础单位类型（去掉种族前缀）
-                    source_base = source_unit.split('_')[-1] if '_' in source_unit else source_unit
-                    target_base = target_unit.split('_')[-1] if '_' in target_unit else target_unit
+                if meta.targeting_bases is not None:
+                    source_base, target_base = meta.targeting_bases
                     
                     # 检查是否有匹配的友方和敌方单位
                     has_source = any(source_base in unit['unit_name'] for unit in friendly_units)
@@ -514,11 +931,11 @@ class PrefabFunctionHandler:
                         score += 5.0
                         if game_state['has_low_health_units']:
                             score += 3.0
-                elif 'heal_' in func_name or 'medivac' in func_name.lower():
+                elif 'heal_' in func_name or 'medivac' in meta.name_lower:
                     # 治疗函数和医疗机相关函数：检查是否有医疗运输机
                     if game_state['has_medivac']:
                         # 为医疗机相关预制函数增加额外评分
-                        if 'follow' in func_name.lower() or 'stay' in func_name.lower():
+                        if 'follow' in meta.name_lower or 'stay' in meta.name_lower:
                             # 跟随类医疗机函数获得更高评分
                             score += 12.0
                         elif game_state['has_low_health_units']:
@@ -577,7 +994,7 @@ class PrefabFunctionHandler:
                     score += 6.0
             
             # 3. 基于战术类别评分
-            tactic_category = func.get('tactic_category', '')
+            tactic_category = meta.tactic_category
             if tactic_category == 'targeting':
                 score += 3.0
             elif tactic_category == 'offense' and game_state['friendly_count'] > game_state['enemy_count']:
@@ -597,62 +1014,13 @@ class PrefabFunctionHandler:
                 score += 6.0
             
             # 4. 基于函数类型评分和单位检查
-            function_type = func.get('function_type', '')
-            linkage_type = func.get('linkage_type', '')
-            
-            # 检查是否为组合类型（考虑function_type或linkage_type）
-            is_combination = function_type == 'combination' or linkage_type == 'combination'
-            
-            # 检查所有需要的单位是否都是我方单位
-            all_units_valid = True
-            required_units = []
+            function_type = meta.function_type
+            is_combination = meta.is_combination
             
-            # 从prerequisites.required_units获取单位
-            if 'prerequisites' in func and 'required_units' in func['prerequisites']:
-                required_units.extend(func['prerequisites']['required_units'])
-            
-            # 从units获取单位（兼容旧格式）
-            if 'units' in func:
-                required_units.extend(func['units'])
-            
-            # 检查所有需要的单位
-            for unit in required_units:
-                # 特殊处理通用单位类型
-                if unit in ['all_friendly', 'all_ground_friendly', 'friendly_infantry', 'all_mechanical', 'all_infantry']:
-                    continue
-                
-                # 提取基础单位类型，支持从TerranMarine中提取Marine
-                if '_' in unit:
-                    unit_base = unit.split('_')[-1]
-                else:
-                    unit_base = unit
-                
-                # 1. 直接匹配：检查单位是否是我方拥有的单位
-                has_unit = any(unit_base.lower() in u['unit_name'].lower() for u in friendly_units)
-                
-                # 2. 提取种族前缀后的部分（如TerranMarine -> Marine）
-                if not has_unit and len(unit_base) > 5:  # 排除太短的单位名称
-                    # 尝试去掉种族前缀（Terran, Protoss, Zerg）
-                    for race_prefix in ['Terran', 'Protoss', 'Zerg']:
-                        if unit_base.startswith(race_prefix):
-                            race_removed = unit_base[len(race_prefix):]
-                            has_unit = any(race_removed.lower() in u['unit_name'].lower() for u in friendly_units)
-                            if has_unit:
-                                break
-                
-                # 3. 更灵活的匹配：检查单位的小写形式是否包含在单位名称的小写形式中
-                if not has_unit:
-                    unit_lower = unit.lower()
-                    has_unit = any(unit_lower in u['unit_name'].lower() for u in friendly_units)
-                
-                # 4. 检查基础单位类型是否匹配（去掉数字后缀）
-                if not has_unit:
-                    base_unit_type = unit_base.split('_')[0] if '_' in unit_base else unit_base
-                    has_unit = any(base_unit_type.lower() == u['unit_name'].split('_')[0].lower() for u in friendly_units)
-                
-                if not has_unit:
-                    all_units_valid = False
-                    break
+            # 检查所有需要的（非通用）单位是否都是我方单位
+            all_units_valid = all(
+                any(units.has_friendly(c) for c in candidates) for candidates in meta.required_candidates
+            )
             
             if is_combination:
                 if all_units_valid:
@@ -662,39 +1030,32 @@ class PrefabFunctionHandler:
                     # 组合函数中包含我方没有的单位，跳过
                     # logger.info(f"跳过预制函数 {func_id} ({func_name}): 组合函数中包含我方没有的单位")
                     continue
-            elif required_units and not all_units_valid:
+            elif not all_units_valid:
                 # 非组合函数但包含我方没有的单位，跳过
                 # logger.info(f"跳过预制函数 {func_id} ({func_name}): 包含我方没有的单位")
                 continue
             elif function_type == 'interaction':
                 score += 2.0
             
-            # 5. 多样性约束：避免重复执行相同函数，但降低惩罚力度
-            recent_history = self.prefab_function_history[-5:]  # 最近5步的历史
-            func_usage_count = recent_history.count(func_id)
-            if func_usage_count > 0:
-                # 降低多样性惩罚，从0.8调整为0.95，允许更频繁使用有效的函数
-                score *= (0.95 ** func_usage_count)
-            
-            # 6. 冷却时间约束：如果函数在冷却中，降低评分，但降低惩罚力度
-            if func_id in self.prefab_function_cooldowns:
-                cooldown = self.prefab_function_cooldowns[func_id]
-                if cooldown > 0:
-                    # 根据剩余冷却时间调整评分，降低惩罚力度
-                    score *= (0.8 + (cooldown / 10.0))  # 冷却惩罚从0.2降低到0.1 per step
-            
-            # 7. 执行结果反馈：根据历史执行结果调整评分
-            if func_id in [result['func_id'] for result in self.prefab_execution_results]:
-                # 查找最近5次执行结果
-                recent_results = [r for r in self.prefab_execution_results if r['func_id'] == func_id][-5:]
-                if recent_results:
-                    # 计算平均成功率
-                    success_rate = sum(1 for r in recent_results if r['success']) / len(recent_results)
-                    # 根据成功率调整评分
-                    score *= (0.5 + success_rate * 0.5)  # 成功率越高，评分加成越高
-            
-            scored_functions.append((func, score))
-            logger.info(f"预制函数评分: ID={func_id}, Name={func_name}, Score={score}")
+            # 5-7. 收集执行历史特征，循环结束后批量调整评分
+            # 多样性约束：最近5步的使用次数，惩罚系数从0.8调整为0.95，允许更频繁使用有效的函数
+            usage_counts.append(recent_usage.get(func_id, 0))
+            # 冷却时间约束：剩余冷却步数，冷却惩罚从0.2降低到0.1 per step
+            cooldowns.append(self.prefab_function_cooldowns.get(func_id, 0))
+            # 执行结果反馈：最近5次执行的平均成功率，成功率越高，评分加成越高
+            recent_results = self._recent_results_by_func.get(func_id)
+            if recent_results:
+                success_rates.append(sum(1 for success in recent_results if success) / len(recent_results))
+            else:
+                success_rates.append(1.0)
+            scored_funcs.append(func)
+            base_scores.append(score)
+        
+        scores = _history_adjusted_scores(base_scores, usage_counts, cooldowns, success_rates)
+        scored_functions = list(zip(scored_funcs, scores))
+        if log_info:
+            for func, score in scored_functions:
+                logger.info(f"预制函数评分: ID={func['function_id']}, Name={func['name']}, Score={score}")
         
         # 按分数排序
         scored_functions.sort(key=lambda x: x[1], reverse=True)
@@ -712,41 +1073,36 @@ class PrefabFunctionHandler:
         Returns:
             List[Dict[str, Any]]: 最优预制函数列表
         """
-        # 按分数排序
-        scored_functions.sort(key=lambda x: x[1], reverse=True)
-        
-        # 选择前top_k个函数
-        optimal_functions = [func for func, score in scored_functions[:top_k] if score > 0]
-        
-        # 记录函数选择情况到性能监控器
+        # 选择分数最高的前top_k个函数（同分保持原有顺序，与稳定降序排序后截取一致）
+        # score_functions 返回的列表已按分数降序排列，无需再整体排序
+        top_scored = [(func, score) for func, score in heapq.nlargest(top_k, scored_functions, key=itemgetter(1)) if score > 0]
+        optimal_functions = [func for func, score in top_scored]
+        
+        # 记录函数选择情况到性能监控器（整批提交）；相关性按函数对象缓存，供下方日志复用
+        relevance_by_func = {}
+        relevances = []
         for func, score in scored_functions:
-            is_selected = func in optimal_functions
             relevance = 0.0
             if game_state:
                 relevance = self._calculate_function_relevance(func, game_state)
-                # 记录预制函数与游戏状态的相关性
-                self.performance_monitor.record_prefab_relevance(
-                    func_id=func['function_id'],
-                    func_name=func['name'],
-                    step=-1,  # 步骤号将在调用处更新
-                    relevance=relevance,
-                    game_state=game_state
-                )
-            
-            self.performance_monitor.record_function_usage(
-                func_id=func['function_id'],
-                func_name=func['name'],
-                step=-1,  # 步骤号将在调用处更新
-                selected=is_selected,
-                confidence=func.get('confidence', 0.0),
-                relevance=relevance
-            )
+                relevance_by_func[id(func)] = relevance
+            relevances.append(relevance)
+        
+        self.performance_monitor.record_function_batch(
+            func_ids=[func['function_id'] for func, _ in scored_functions],
+            func_names=[func['name'] for func, _ in scored_functions],
+            step=-1,  # 步骤号将在调用处更新
+            selected=[func in optimal_functions for func, _ in scored_functions],
+            confidences=[func.get('confidence', 0.0) for func, _ in scored_functions],
+            relevances=relevances,
+            game_state=game_state
+        )
         
         logger.info(f"最终选择了 {len(optimal_functions)} 个最优预制函数:")
-        for i, func in enumerate(optimal_functions, 1):
-            score = next(s for f, s in scored_functions if f == func)
-            relevance = self._calculate_function_relevance(func, game_state) if game_state else 0.0
-            logger.info(f"  {i}. ID={func['function_id']}, Name={func['name']}, Score={score}, Relevance={relevance}")
+        if logger.isEnabledFor(logging.INFO):
+            for i, (func, score) in enumerate(top_scored, 1):
+                relevance = relevance_by_func.get(id(func), 0.0)
+                logger.info(f"  {i}. ID={func['function_id']}, Name={func['name']}, Score={score}, Relevance={relevance}")
         
         # 记录最终选择的预制函数（暂时注释，后续集成新的日志系统）
         # for func in optimal_functions:
@@ -781,33 +1137,44 @@ class PrefabFunctionHandler:
         return {}
     
     def update_unit_pool(self, friendly_units: List[UnitInfo], enemy_units: List[UnitInfo] = None):
-        """更新单位池"""
+        """
+        更新单位池
+        
+        列式视图和协同适配性特征按单位池列表缓存（列表长度变化时自动失效）；原地修改池中单位（位置、类型等）
+        或等长替换列表元素后须重新调用本方法
+        """
         self.unit_pool = {
             'friendly': friendly_units,
             'enemy': enemy_units or []
         }
+        # 同步生成列式视图，后续评估直接读取坐标数组和类型集合
+        self.unit_pool_np = {
+            side: _build_unit_arrays(units) for side, units in self.unit_pool.items()
+        }
+    
+    def _get_pool_arrays(self, units: List[UnitInfo]) -> Optional[_UnitArrays]:
+        """
+        返回 update_unit_pool 为该列表生成的列式视图；列表不是生成视图时的原列表或长度已变化时返回 None
+        """
+        for arrays in self.unit_pool_np.values():
+            if units is arrays.units and len(units) == len(arrays.unit_types):
+                return arrays
+        return None
+    
+    def _get_unit_arrays(self, units: List[UnitInfo]) -> _UnitArrays:
+        """
+        获取单位列表的列式视图：有对应的单位池视图时直接复用，否则现场构建
+        """
+        arrays = self._get_pool_arrays(units)
+        return arrays if arrays is not None else _build_unit_arrays(units)
     
     def _normalize_unit_name(self, unit_name: str) -> str:
         """标准化单位名称，用于匹配"""
         if not unit_name:
             return ""
         
-        # 去除空格和下划线，转为小写
-        normalized = unit_name.replace(" ", "").replace("_", "").lower()
-        
-        # 处理种族前缀
-        prefixes = ["protoss", "terran", "zerg"]
-        for prefix in prefixes:
-            if normalized.startswith(prefix):
-                # 去除种族前缀，保留基础名称
-                base_name = normalized[len(prefix):]
-                # 去除数字后缀
-                base_name = ''.join([c for c in base_name if not c.isdigit()])
-                return base_name
-        
-        # 去除数字后缀
-        normalized = ''.join([c for c in normalized if not c.isdigit()])
-        return normalized
+        # 去除空格、下划线、种族前缀和数字后缀，转为小写；同一名称只计算一次
+        return _canonical_unit_name(unit_name)
     
     def _is_unit_match(self, required_unit: str, available_unit: str) -> bool:
         """检查单位是否匹配，仅支持精确匹配"""
@@ -839,25 +1206,17 @@ class PrefabFunctionHandler:
         if not friendly_units:
             return terrain_analysis
         
-        # 计算单位位置分布的紧凑度来检测可能的瓶颈
-        friendly_positions = [unit.position for unit in friendly_units]
-        enemy_positions = [unit.position for unit in enemy_units]
-        
-        # 检测瓶颈：如果单位分布非常集中
-        if len(friendly_positions) >= 3:
-            # 计算位置方差
-            avg_x = sum(pos[0] for pos in friendly_positions) / len(friendly_positions)
-            avg_y = sum(pos[1] for pos in friendly_positions) / len(friendly_positions)
-            variance_x = sum((pos[0] - avg_x)**2 for pos in friendly_positions) / len(friendly_positions)
-            variance_y = sum((pos[1] - avg_y)**2 for pos in friendly_positions) / len(friendly_positions)
-            
-            # 如果方差很小，可能处于瓶颈
-            if variance_x < 1000 and variance_y < 1000:
-                terrain_analysis['has_choke_point'] = True
+        # 计算单位位置分布的紧凑度来检测可能的瓶颈；单位较少时逐单位计算比 NumPy 的固定开销更快
+        if len(friendly_units) < _NUMPY_TERRAIN_MIN_UNITS:
+            stats = _terrain_stats_scalar(friendly_units, enemy_units)
+        else:
+            stats = _terrain_stats_numpy(self._get_unit_arrays(friendly_units).xy,
+                                         self._get_unit_arrays(enemy_units).xy)
+        variance, avg_friendly_y, avg_enemy_y, avg_distance, x_values, y_values = stats
         
-        # 简化的高地检测（基于y坐标，假设y值越高位置越高）
-        avg_friendly_y = sum(pos[1] for pos in friendly_positions) / len(friendly_positions) if friendly_positions else 0
-        avg_enemy_y = sum(pos[1] for pos in enemy_positions) / len(enemy_positions) if enemy_positions else 0
+        # 检测瓶颈：如果单位分布非常集中（方差很小）
+        if variance is not None and variance[0] < 1000 and variance[1] < 1000:
+            terrain_analysis['has_choke_point'] = True
         
         # 高地优势判断
         if avg_friendly_y > avg_enemy_y + 20:
@@ -865,26 +1224,12 @@ class PrefabFunctionHandler:
         elif avg_enemy_y > avg_friendly_y + 20:
             terrain_analysis['enemy_on_high_ground'] = True
         
-        # 简化的掩体检测（基于单位间距）
-        if len(friendly_positions) >= 2:
-            # 计算单位间平均距离
-            distances = []
-            for i in range(len(friendly_positions)):
-                for j in range(i+1, len(friendly_positions)):
-                    dist = ((friendly_positions[i][0] - friendly_positions[j][0])**2 + 
-                            (friendly_positions[i][1] - friendly_positions[j][1])**2)**0.5
-                    distances.append(dist)
-            
-            avg_distance = sum(distances) / len(distances) if distances else 0
-            
-            # 如果单位间距离适中，可能有良好的掩体分布
-            if 10 < avg_distance < 30:
-                terrain_analysis['friendly_has_cover'] = True
+        # 简化的掩体检测：如果单位间距离适中，可能有良好的掩体分布
+        if avg_distance is not None and 10 < avg_distance < 30:
+            terrain_analysis['friendly_has_cover'] = True
         
         # 地形复杂度评估（基于位置多样性）
-        x_values = set(pos[0] for pos in friendly_positions)
-        y_values = set(pos[1] for pos in friendly_positions)
-        terrain_analysis['terrain_complexity'] = min(1.0, (len(x_values) + len(y_values)) / 20.0)
+        terrain_analysis['terrain_complexity'] = min(1.0, (x_values + y_values) / 20.0)
         
         return terrain_analysis
     
@@ -899,12 +1244,9 @@ class PrefabFunctionHandler:
                     unit_type_str = str(unit.unit_type).lower()
                 
                 # 检测种族关键字
-                if any(protoss in unit_type_str for protoss in ['zealot', 'stalker', 'phoenix', 'immortal', 'archon', 'sentry', 'hightemplar', 'darktemplar', 'colossus', 'observer', 'warp prism', 'carrier', 'tempest', 'void ray', 'protoss']):
-                    return 'protoss'
-                elif any(terran in unit_type_str for terran in ['marine', 'marauder', 'reaper', 'ghost', 'hellbat', 'siegetank', 'thor', 'medivac', 'viking', 'banshee', 'raven', 'battlecruiser', 'liberator', 'terran']):
-                    return 'terran'
-                elif any(zerg in unit_type_str for zerg in ['zergling', 'baneling', 'roach', 'ravager', 'hydralisk', 'lurker', 'mutalisk', 'corruptor', 'viper', 'ultralisk', 'infestor', 'swarm host', 'brood lord', 'queen', 'drone', 'overlord', 'zerg']):
-                    return 'zerg'
+                for race, keyword_re in _RACE_KEYWORD_RES:
+                    if keyword_re.search(unit_type_str):
+                        return race
             
             # 检测失败，检查是否有默认种族
             if self.default_race:
@@ -937,17 +1279,24 @@ class PrefabFunctionHandler:
             return positioning_scores
         
         # 简化的单位分类：假设某些单位类型是前线，某些是支援
-        frontline_units = {
-            'ProtossZealot', 'ProtossImmortal', 'ProtossArchon',
-            'TerranMarine', 'TerranMarauder', 'TerranSiegeTank', 'TerranThor',
-            'ZergZergling', 'ZergRoach', 'ZergUltralisk'
-        }
-        
-        support_units = {
-            'ProtossHighTemplar', 'ProtossSentry', 'ProtossObserver',
-            'TerranMedivac', 'TerranRaven', 'TerranGhost',
-            'ZergQueen', 'ZergInfestor', 'ZergViper'
-        }
+        frontline_units = _FRONTLINE_UNIT_TYPES
+        support_units = _POSITIONING_SUPPORT_UNIT_TYPES
+        
+        # 单位较多时使用 numba 内核一次遍历完成前三项评估
+        if _positioning_kernel is not None and len(friendly_units) >= _NUMBA_MIN_UNITS:
+            frontline_mask = np.array([unit.unit_type in frontline_units for unit in friendly_units], dtype=np.bool_)
+            support_mask = np.array([unit.unit_type in support_units for unit in friendly_units], dtype=np.bool_)
+            (positioning_scores['frontline_cohesion'],
+             positioning_scores['support_behind_frontline'],
+             positioning_scores['flanking_potential']) = _positioning_kernel(
+                self._get_unit_arrays(friendly_units).xy, frontline_mask, support_mask,
+                self._get_unit_arrays(enemy_units).xy)
+            positioning_scores['overall_positioning'] = (
+                positioning_scores['frontline_cohesion'] * 0.3 +
+                positioning_scores['support_behind_frontline'] * 0.3 +
+                positioning_scores['flanking_potential'] * 0.4
+            )
+            return positioning_scores
         
         # 提取前线和支援单位
         friendly_frontline = [unit for unit in friendly_units if unit.unit_type in frontline_units]
@@ -1029,7 +1378,7 @@ class PrefabFunctionHandler:
             self.prefab_function_cooldowns[func_id] = 1  # 其他函数冷却1步
         
         # 记录执行结果
-        self.prefab_execution_results.append({
+        self._append_execution_result({
             'func_id': func_id,
             'func_name': func_name,
             'step': step_count,
@@ -1037,14 +1386,30 @@ class PrefabFunctionHandler:
             'actions': actions
         })
     
+    def _append_execution_result(self, execution_result: Dict[str, Any]) -> None:
+        """
+        追加执行结果，并同步更新该函数最近5次的执行结果
+        
+        Args:
+            execution_result: 执行结果记录，需包含func_id和success
+        """
+        self.prefab_execution_results.append(execution_result)
+        func_id = execution_result['func_id']
+        recent_results = self._recent_results_by_func.get(func_id)
+        if recent_results is None:
+            recent_results = self._recent_results_by_func[func_id] = deque(maxlen=5)
+        recent_results.append(execution_result['success'])
+    
     def decrement_cooldowns(self) -> None:
         """
         递减所有预制函数的冷却时间
         """
-        for func_id in list(self.prefab_function_cooldowns.keys()):
-            self.prefab_function_cooldowns[func_id] -= 1
-            if self.prefab_function_cooldowns[func_id] <= 0:
-                del self.prefab_function_cooldowns[func_id]
+        # 一次遍历重建字典：剩余冷却大于1的递减保留，其余（递减后<=0）直接移除
+        self.prefab_function_cooldowns = {
+            func_id: cooldown - 1
+            for func_id, cooldown in self.prefab_function_cooldowns.items()
+            if cooldown > 1
+        }
     
     def record_execution_result(self, func_id: str, success: bool, game_state_before: Dict[str, Any], game_state_after: Dict[str, Any], actions: Dict[str, List[Any]] = None):
         """
@@ -1084,7 +1449,7 @@ class PrefabFunctionHandler:
             'execution_quality': execution_quality
         }
         
-        self.prefab_execution_results.append(execution_result)
+        self._append_execution_result(execution_result)
         logger.info(f"记录预制函数执行结果: ID={func_id}, 成功={success}")
         
         # 记录决策影响
@@ -1249,67 +1614,111 @@ class PrefabFunctionHandler:
         
         return min(10.0, fitness_score)
     
+    def _unit_set_features(self, friendly_units: List[UnitInfo], enemy_units: List[UnitInfo]) -> Dict[str, Any]:
+        """
+        一次性统计各协同适配性评估所需的单位类型特征
+        
+        双方列表都有对应的单位池视图时按视图对象缓存（距离分档、聚集度由需要的评估按需补入）；
+        其他列表每次现场统计，不构建坐标数组。
+        """
+        friendly_arrays = self._get_pool_arrays(friendly_units)
+        enemy_arrays = self._get_pool_arrays(enemy_units)
+        is_pool = friendly_arrays is not None and enemy_arrays is not None
+        if is_pool:
+            cached = self._unit_features_cache
+            if cached is not None and cached[0] is friendly_arrays and cached[1] is enemy_arrays:
+                return cached[2]
+            friendly_types = friendly_arrays.type_set
+            enemy_type_list = enemy_arrays.unit_types
+        else:
+            friendly_types = {unit.unit_type for unit in friendly_units}
+            enemy_type_list = [unit.unit_type for unit in enemy_units]
+        
+        # 敌人威胁度
+        threat_level = 0
+        for enemy_type in enemy_type_list:
+            if enemy_type in _HIGH_THREAT_UNITS:
+                threat_level += 2
+            elif enemy_type in _MEDIUM_THREAT_UNITS:
+                threat_level += 1
+        
+        features = {
+            'has_air_units': not friendly_types.isdisjoint(_AIR_UNITS),
+            'has_ground_units': not friendly_types.isdisjoint(_GROUND_UNITS),
+            'has_melee_units': not friendly_types.isdisjoint(_MELEE_UNITS),
+            'has_ranged_units': not friendly_types.isdisjoint(_RANGED_UNITS),
+            'has_ability_units': not friendly_types.isdisjoint(_ABILITY_UNITS),
+            'has_ability_support_units': not friendly_types.isdisjoint(_ABILITY_SUPPORT_UNITS),
+            'has_specialized_units': not friendly_types.isdisjoint(_SPECIALIZED_UNITS),
+            'has_support_units': not friendly_types.isdisjoint(_SUPPORT_UNITS),
+            'has_dps_units': not friendly_types.isdisjoint(_DPS_UNITS),
+            'friendly_type_count': len(friendly_types),
+            'has_high_value_targets': not _HIGH_VALUE_TARGET_UNITS.isdisjoint(enemy_type_list),
+            'enemy_count': len(enemy_type_list),
+            'threat_level': threat_level
+        }
+        if is_pool:
+            self._unit_features_cache = (friendly_arrays, enemy_arrays, features)
+        return features
+    
     def _evaluate_air_ground_fitness(self, friendly_units: List[UnitInfo], enemy_units: List[UnitInfo]) -> float:
         """评估地空协同适配性"""
-        has_air_units = any(unit.unit_type in ['ProtossPhoenix', 'ProtossCorsair', 'ProtossCarrier', 'TerranViking', 'TerranBanshee', 'TerranBattlecruiser', 'ZergMutalisk', 'ZergCorruptor'] for unit in friendly_units)
-        has_ground_units = any(unit.unit_type in ['ProtossZealot', 'ProtossStalker', 'ProtossSentry', 'TerranMarine', 'TerranMarauder', 'TerranSiegeTank', 'ZergZergling', 'ZergRoach', 'ZergUltralisk'] for unit in friendly_units)
-        has_high_value_targets = any(unit.unit_type in ['TerranSiegeTank', 'TerranThor', 'ZergUltralisk', 'ProtossColossus'] for unit in enemy_units)
+        features = self._unit_set_features(friendly_units, enemy_units)
         
         score = 0.0
-        if has_air_units:
+        if features['has_air_units']:
             score += 4.0
-        if has_ground_units:
+        if features['has_ground_units']:
             score += 4.0
-        if has_high_value_targets:
+        if features['has_high_value_targets']:
             score += 2.0
             
         return score
     
     def _evaluate_long_short_range_fitness(self, friendly_units: List[UnitInfo], enemy_units: List[UnitInfo]) -> float:
         """评估远近程协同适配性"""
-        has_melee_units = any(unit.unit_type in ['ProtossZealot', 'ProtossDarkTemplar', 'TerranMarine', 'ZergZergling', 'ZergBaneling'] for unit in friendly_units)
-        has_ranged_units = any(unit.unit_type in ['ProtossStalker', 'ProtossImmortal', 'TerranMarauder', 'TerranSiegeTank', 'ZergHydralisk', 'ZergLurker'] for unit in friendly_units)
-        
-        # 敌人距离多样化
-        enemy_distances = []
-        for enemy in enemy_units[:3]:  # 只考虑前3个敌人
-            for friendly in friendly_units:
-                distance = ((enemy.position[0] - friendly.position[0])**2 + (enemy.position[1] - friendly.position[1])**2)**0.5
-                enemy_distances.append(distance)
-        
-        distance_variance = len(set([int(d/10) for d in enemy_distances])) if enemy_distances else 0
+        features = self._unit_set_features(friendly_units, enemy_units)
+        
+        distance_variance = features.get('distance_variance')
+        if distance_variance is None:
+            # 敌人距离多样化：前3个敌人与所有友方单位的距离按10为间隔分档，统计档位数
+            # 直接对坐标差广播求距离（而非 |x|²+|y|²-2x·y 展开式），避免舍入误差改变分档
+            nearest_enemy_xy = self._get_unit_arrays(enemy_units).xy[:3]  # 只考虑前3个敌人
+            friendly_xy = self._get_unit_arrays(friendly_units).xy
+            diff = nearest_enemy_xy[:, None, :] - friendly_xy[None, :, :]
+            enemy_distances = np.sqrt((diff * diff).sum(axis=-1))
+            distance_variance = features['distance_variance'] = np.unique(np.trunc(enemy_distances / 10)).size
         
         score = 0.0
-        if has_melee_units:
+        if features['has_melee_units']:
             score += 3.0
-        if has_ranged_units:
+        if features['has_ranged_units']:
             score += 3.0
         if distance_variance >= 2:
             score += 2.0
-        if len(enemy_units) >= 3:
+        if features['enemy_count'] >= 3:
             score += 2.0
             
         return score
     
     def _evaluate_ability_synergy_fitness(self, friendly_units: List[UnitInfo], enemy_units: List[UnitInfo]) -> float:
         """评估技能协同适配性"""
-        has_ability_units = any(unit.unit_type in ['ProtossHighTemplar', 'ProtossSentry', 'TerranGhost', 'TerranMedivac', 'ZergInfestor', 'ZergQueen'] for unit in friendly_units)
-        has_support_units = any(unit.unit_type in ['ProtossSentry', 'ProtossZealot', 'TerranMedivac', 'ZergQueen'] for unit in friendly_units)
-        
-        # 敌人聚集度
-        if len(enemy_units) >= 3:
-            positions = [unit.position for unit in enemy_units]
-            avg_x = sum(pos[0] for pos in positions) / len(positions)
-            avg_y = sum(pos[1] for pos in positions) / len(positions)
-            variance = sum((pos[0] - avg_x)**2 + (pos[1] - avg_y)**2 for pos in positions) / len(positions)
-            cluster_factor = 1.0 if variance < 1000 else 0.5
-        else:
-            cluster_factor = 0.0
+        features = self._unit_set_features(friendly_units, enemy_units)
+        
+        cluster_factor = features.get('cluster_factor')
+        if cluster_factor is None:
+            # 敌人聚集度：到质心的平均平方距离，即x、y方向方差之和
+            if features['enemy_count'] >= 3:
+                variance = self._get_unit_arrays(enemy_units).xy.var(axis=0).sum()
+                cluster_factor = 1.0 if variance < 1000 else 0.5
+            else:
+                cluster_factor = 0.0
+            features['cluster_factor'] = cluster_factor
         
         score = 0.0
-        if has_ability_units:
+        if features['has_ability_units']:
             score += 4.0
-        if has_support_units:
+        if features['has_ability_support_units']:
             score += 3.0
         score += cluster_factor * 3.0
             
@@ -1317,38 +1726,28 @@ class PrefabFunctionHandler:
     
     def _evaluate_armor_coordination_fitness(self, friendly_units: List[UnitInfo], enemy_units: List[UnitInfo]) -> float:
         """评估装甲协同适配性"""
-        has_specialized_units = any(unit.unit_type in ['ProtossImmortal', 'ProtossColossus', 'TerranSiegeTank', 'TerranThor', 'ZergUltralisk'] for unit in friendly_units)
-        has_diverse_units = len(set(unit.unit_type for unit in friendly_units)) >= 3
+        features = self._unit_set_features(friendly_units, enemy_units)
         
         score = 0.0
-        if has_specialized_units:
+        if features['has_specialized_units']:
             score += 5.0
-        if has_diverse_units:
+        if features['friendly_type_count'] >= 3:
             score += 3.0
-        if len(enemy_units) >= 2:
+        if features['enemy_count'] >= 2:
             score += 2.0
             
         return score
     
     def _evaluate_support_dps_fitness(self, friendly_units: List[UnitInfo], enemy_units: List[UnitInfo]) -> float:
         """评估支援输出协同适配性"""
-        has_support_units = any(unit.unit_type in ['ProtossSentry', 'ProtossHighTemplar', 'ProtossObserver', 'TerranMedivac', 'TerranRaven', 'ZergQueen', 'ZergInfestor'] for unit in friendly_units)
-        has_dps_units = any(unit.unit_type in ['ProtossZealot', 'ProtossStalker', 'ProtossDarkTemplar', 'TerranMarine', 'TerranMarauder', 'ZergZergling', 'ZergHydralisk'] for unit in friendly_units)
-        
-        # 敌人威胁度
-        threat_level = 0
-        for enemy in enemy_units:
-            if enemy.unit_type in ['TerranGhost', 'TerranRaven', 'ZergViper', 'ProtossHighTemplar']:
-                threat_level += 2
-            elif enemy.unit_type in ['TerranBattlecruiser', 'ZergUltralisk', 'ProtossColossus']:
-                threat_level += 1
+        features = self._unit_set_features(friendly_units, enemy_units)
         
         score = 0.0
-        if has_support_units:
+        if features['has_support_units']:
             score += 4.0
-        if has_dps_units:
+        if features['has_dps_units']:
             score += 4.0
-        score += min(2.0, threat_level * 0.5)
+        score += min(2.0, features['threat_level'] * 0.5)
             
         return score
     
@@ -1474,7 +1873,7 @@ class PrefabFunctionHandler:
         """
         relevance = func.get('confidence', 0.5)  # 基础相关性为置信度
         
-        func_name = func['name']
+        func_name_lower = self._get_func_meta(func).name_lower
         
         # 1. 单位匹配度检查（强化版）
         friendly_types = game_state.get('friendly_unit_types', {})
@@ -1483,7 +1882,7 @@ class PrefabFunctionHandler:
         # 检查函数中指定的源单位是否存在于我方单位中
         if 'source_unit' in func:
             source_unit = func['source_unit']
-            source_base = source_unit.split('_')[-1] if '_' in source_unit else source_unit
+            source_base = source_unit.rsplit('_', 1)[-1]
             if any(source_base.lower() in unit.lower() for unit in friendly_types.keys()):
                 relevance += 0.2  # 源单位存在，增加相关性
             else:
@@ -1494,14 +1893,14 @@ class PrefabFunctionHandler:
             target_unit = func['target_unit']
             # 如果是通用目标类型，允许
             if target_unit not in ['high_value_enemy_unit', 'high_value_terran_unit', 'nearest_enemy', 'nearest_enemy_unit', 'highest_threat_enemy', 'lowest_health_enemy', 'armored_enemy', 'light_enemy', 'lowest_health_friendly', 'all_enemy', 'closest_enemy']:
-                target_base = target_unit.split('_')[-1] if '_' in target_unit else target_unit
+                target_base = target_unit.rsplit('_', 1)[-1]
                 if any(target_base.lower() in unit.lower() for unit in enemy_types.keys()):
                     relevance += 0.2  # 目标单位存在，增加相关性
                 else:
                     relevance -= 0.5  # 目标单位不存在，大幅降低相关性
         
         # 2. 基于函数类型和游戏状态的详细相关性评估
-        if 'mm_push' in func_name.lower():
+        if 'mm_push' in func_name_lower:
             # MM推进函数：检查是否有足够的Marine和Marauder
             marine_count = friendly_types.get('Marine', 0)
             marauder_count = friendly_types.get('Marauder', 0)
@@ -1516,7 +1915,7 @@ class PrefabFunctionHandler:
             if game_state.get('enemy_count', 0) <= total_mm:
                 relevance += 0.1  # 敌方数量适中，适合推进
         
-        elif 'heal' in func_name.lower() or 'medivac' in func_name.lower():
+        elif 'heal' in func_name_lower or 'medivac' in func_name_lower:
             # 治疗函数：检查是否有医疗运输机和受伤单位
             if game_state.get('has_medivac', False):
                 relevance += 0.2  # 有医疗运输机
@@ -1527,7 +1926,7 @@ class PrefabFunctionHandler:
             if game_state.get('high_energy_units', False):
                 relevance += 0.1  # 医疗运输机能量充足
         
-        elif 'stim' in func_name.lower():
+        elif 'stim' in func_name_lower:
             # 兴奋剂函数：检查是否有大量陆战队或掠夺者
             marine_count = friendly_types.get('Marine', 0)
             marauder_count = friendly_types.get('Marauder', 0)
@@ -1542,7 +1941,7 @@ class PrefabFunctionHandler:
             if game_state.get('enemy_count', 0) > 0:
                 relevance += 0.1  # 处于战斗状态，适合使用兴奋剂
         
-        elif 'siege' in func_name.lower():
+        elif 'siege' in func_name_lower:
             # 攻城/解除攻城函数：检查是否有攻城坦克
             siege_tank_count = friendly_types.get('SiegeTank', 0)
             if siege_tank_count > 0:
@@ -1552,7 +1951,7 @@ class PrefabFunctionHandler:
                 if game_state.get('friendly_count', 0) >= game_state.get('enemy_count', 0):
                     relevance += 0.1  # 我方数量占优，适合攻城推进
         
-        elif 'attack' in func_name.lower() or 'focusfire' in func_name.lower():
+        elif 'attack' in func_name_lower or 'focusfire' in func_name_lower:
             # 攻击/集火函数：检查敌方单位数量和我方攻击能力
             enemy_count = game_state.get('enemy_count', 0)
             friendly_count = game_state.get('friendly_count', 0)
@@ -1562,7 +1961,7 @@ class PrefabFunctionHandler:
             if friendly_count > enemy_count:
                 relevance += 0.2  # 我方数量占优，适合主动攻击
         
-        elif 'move' in func_name.lower() or 'retreat' in func_name.lower():
+        elif 'move' in func_name_lower or 'retreat' in func_name_lower:
             # 移动/撤退函数：根据单位数量和位置调整
             friendly_count = game_state.get('friendly_count', 0)
             enemy_count = game_state.get('enemy_count', 0)
@@ -1604,11 +2003,11 @@ class PrefabFunctionHandler:
         # 5. 基于游戏阶段的调整（如果有游戏阶段信息）
         if 'game_stage' in game_state:
             game_stage = game_state['game_stage']
-            if game_stage == 'early' and 'early' in func_name.lower():
+            if game_stage == 'early' and 'early' in func_name_lower:
                 relevance += 0.1  # 早期游戏，适合早期战术
-            elif game_stage == 'mid' and 'mid' in func_name.lower():
+            elif game_stage == 'mid' and 'mid' in func_name_lower:
                 relevance += 0.1  # 中期游戏，适合中期战术
-            elif game_stage == 'late' and 'late' in func_name.lower():
+            elif game_stage == 'late' and 'late' in func_name_lower:
                 relevance += 0.1  # 后期游戏，适合后期战术
         
         # 确保相关性在0-1范围内
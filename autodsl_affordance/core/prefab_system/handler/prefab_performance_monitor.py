@@ -79,6 +79,48 @@ class PrefabPerformanceMonitor:
         }
         self.prefab_relevance_history.append(relevance_record)
 
+    def record_function_batch(self, func_ids: List[str], func_names: List[str], step: int, selected: List[bool],
+                              confidences: List[float], relevances: List[float], game_state: Dict[str, Any] = None):
+        """
+        批量记录一次决策中所有候选函数的使用情况（及相关性）
+        
+        Args:
+            func_ids: 函数ID列表
+            func_names: 函数名称列表
+            step: 当前步骤
+            selected: 各函数是否被选中
+            confidences: 各函数置信度
+            relevances: 各函数与游戏状态的相关性
+            game_state: 当前游戏状态，提供时同时记录相关性历史
+        """
+        # 同一批记录共用一个时间戳
+        timestamp = logging.Formatter('%(asctime)s').formatTime(logging.LogRecord('name', 0, '', 0, '', '', '', 0, ''))
+        rows = list(zip(func_ids, func_names, selected, confidences, relevances))
+        if game_state:
+            self.prefab_relevance_history.extend(
+                {
+                    'func_id': func_id,
+                    'func_name': func_name,
+                    'step': step,
+                    'relevance': relevance,
+                    'game_state': game_state,
+                    'timestamp': timestamp
+                }
+                for func_id, func_name, _, _, relevance in rows
+            )
+        self.function_usage_history.extend(
+            {
+                'func_id': func_id,
+                'func_name': func_name,
+                'step': step,
+                'selected': is_selected,
+                'confidence': confidence,
+                'relevance': relevance,
+                'timestamp': timestamp
+            }
+            for func_id, func_name, is_selected, confidence, relevance in rows
+        )
+
     def record_decision_impact(self, step: int, pre_game_state: Dict[str, Any], post_game_state: Dict[str, Any], actions: Dict[str, Any]):
         """
         记录决策对游戏状态的影响